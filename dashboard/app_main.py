@@ -1,21 +1,19 @@
 import streamlit as st
-import app_intro
-import app_world_trial
-import app_us_trial
-import app_cluster
-import app_predict_activeness
+import page_loader
 
 # Page configuration -- set to wide
 st.set_page_config(layout="wide")
 
+# page modules are imported on their first selection, so the heavy geo / ML dependencies of a page
+# are only loaded by the sessions that open it (see page_loader.py)
 PAGES = {
-    "Homepage": app_intro,
-    "World trials": app_world_trial,
-    "U.S. trials": app_us_trial,
-    "Clustering trials by similarity": app_cluster,
-    "Predicting trials' activity status" : app_predict_activeness
+    "Homepage": "app_intro",
+    "World trials": "app_world_trial",
+    "U.S. trials": "app_us_trial",
+    "Clustering trials by similarity": "app_cluster",
+    "Predicting trials' activity status" : "app_predict_activeness"
 }
 st.sidebar.title('Navigation')
 selection = st.sidebar.selectbox("Go to page:", list(PAGES.keys()))
-page = PAGES[selection]
+page = page_loader.load_page(PAGES[selection])
 page.app()
@@ -23,15 +23,17 @@ from xgboost import XGBRFClassifier
 from sklearn.metrics import roc_curve, auc, precision_recall_curve, confusion_matrix
 from sklearn import model_selection
 import sys
+import data_access
 
 
 def app():
 
-    X_train = pd.read_csv("https://raw.githubusercontent.com/oena/bios823_final_project/master/dashboard/dashboard_data/X_train.csv")
-    X_test = pd.read_csv("https://raw.githubusercontent.com/oena/bios823_final_project/master/dashboard/dashboard_data/X_test.csv")
-    y_train = pd.read_csv("https://raw.githubusercontent.com/oena/bios823_final_project/master/dashboard/dashboard_data/y_train.csv")
-    y_test = pd.read_csv("https://raw.githubusercontent.com/oena/bios823_final_project/master/dashboard/dashboard_data/y_test.csv")
-    compare_model_df = pd.read_csv("https://raw.githubusercontent.com/oena/bios823_final_project/master/dashboard/dashboard_data/compare_model_df.csv")
+    # kept in memory by data_access, so reruns do not read (or download) the files again
+    X_train = data_access.load("X_train")
+    X_test = data_access.load("X_test")
+    y_train = data_access.load("y_train")
+    y_test = data_access.load("y_test")
+    compare_model_df = data_access.load("compare_model_df")
 
     st.sidebar.subheader("Classifiers comparison:")
     select_measure = st.sidebar.selectbox("Please select a metric:",
@@ -1,7 +1,10 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
 import base64
+import data_access
+import spatial
 
 def app():
     px.set_mapbox_access_token("pk.eyJ1Ijoib2VuYWNoZSIsImEiOiJjazM2NWVwcmUxZnc3M2JvcXVvbjJiN2dpIn0.WZidyL9W3mlaLbM0TvAVXQ")
@@ -13,13 +16,36 @@ def app():
         Loads dataset of US trial information only; this is a portion of the global trial information, with additional location information added using `geopy`. 
         
         Returns: 
-        - all_us_data (pd.DataFrame): information for of all ongoing COVID19 trials in the US
+        - all_us_data (pd.DataFrame): information for of all ongoing COVID19 trials in the US, one row per trial and US site (built from the `trial_sites` table)
         """
         # All US clinical trials
-        data_df = pd.read_csv("https://media.githubusercontent.com/media/oena/bios823_final_project/master/dashboard/dashboard_data/cleaned_us_covid_studies_with_geo_092020.tsv", sep="\t")
+        data_df = data_access.load("cleaned_us_covid_studies_with_geo_092020")
         all_us_data = data_df.dropna()
         return all_us_data
 
+    @st.cache()
+    def load_state_counts():
+        """
+        Loads the trial and site counts by state, phase and intervention type precomputed by `data_cleaning/modify_us_study_data.py`.
+
+        Returns:
+        - state_counts (pd.DataFrame): one row per state (USPS code), phase and intervention type, or None if the aggregates have not been built
+        """
+        try:
+            return data_access.load("us_state_counts")
+        except FileNotFoundError:
+            return None
+
+    @st.cache(allow_output_mutation=True)
+    def load_site_index():
+        """
+        Builds the spatial index over the geocoded US sites, once per session.
+
+        Returns:
+        - site_index (spatial.SiteIndex): haversine BallTree over the sites of `load_datasets()`
+        """
+        return spatial.SiteIndex(load_datasets())
+
     @st.cache()
     def load_filtering_options(all_us_data):
         """
@@ -137,6 +163,16 @@ def app():
     # Sidebar to switch between study locations and latest covid rates
     st.sidebar.subheader("Filter trial information:")
 
+    near_me = st.sidebar.checkbox("Only show trials near a location")
+    if near_me:
+        near_lat = st.sidebar.number_input("Latitude:", min_value=-90.0, max_value=90.0, value=36.0, step=0.1)
+        near_lon = st.sidebar.number_input("Longitude:", min_value=-180.0, max_value=180.0, value=-78.9, step=0.1)
+        radius = st.sidebar.slider("Within (miles):", min_value=5, max_value=500, value=50, step=5)
+        # sites within the radius, nearest first; the other filters below narrow them down further
+        distances = load_site_index().within(near_lat, near_lon, radius)
+        us_study_data = us_study_data.loc[distances.index].assign(**{"Distance (miles)": distances.round(1).to_numpy()})
+        filter_options = load_filtering_options(us_study_data)
+
     state_value = st.sidebar.selectbox("Filter trials by state:",
                                        filter_options["by_state"])
     if state_value != "All available states":
@@ -176,37 +212,68 @@ def app():
         radio_display = c2.radio("Choose one of:",
                         options=["Number of ongoing trials",
                                  "Number of interventions",
-                                 "Trial enrollment status"])
+                                 "Trial enrollment status",
+                                 "Number of trials by state"])
 
-        # Plot map
-        filtered_count_df = filter_dataset(us_study_data,
-                      intervention,
-                      radio_display,
-                       "count")
-        # Color palette type needs to change depending on what's displayed
-        if radio_display == "Trial enrollment status":
-            count_map = px.scatter_mapbox(filtered_count_df,
-                            lat="Latitude",
-                            lon="Longitude",
-                            color=radio_display,
-                            size="Enrollment",
-                            hover_name="Institution",
-                            mapbox_style="light",
-                            center={"lat": 38, "lon": -95},
-                            zoom=2)
+        state_counts = load_state_counts() if radio_display == "Number of trials by state" else None
+        if state_counts is not None:
+            # State overview -- drawn from the precomputed state aggregates, without touching the site-level rows
+            if phase_value != "All phases":
+                state_counts = state_counts[state_counts["Phases"] == phase_value]
+            if intervention_type != "All available interventions":
+                state_counts = state_counts[state_counts["Intervention Type"] == intervention_type]
+            state_count_df = state_counts.groupby("state_code", observed=True)[["Number of trials", "Number of sites"]].sum()
+            count_map = go.Figure(go.Choropleth(locations=state_count_df.index,
+                                                z=state_count_df["Number of trials"],
+                                                locationmode="USA-states",
+                                                colorscale="Viridis",
+                                                colorbar_title="Number of trials",
+                                                customdata=state_count_df["Number of sites"],
+                                                hovertemplate="%{location}<br>%{z} trials at %{customdata} sites<extra></extra>"))
+            count_map.update_layout(geo_scope="usa", width=1100, height=600, margin={"r": 0, "t": 0, "l": 0, "b": 0})
+            c1.plotly_chart(count_map, use_container_width=True)
+            c2.markdown("Counts follow the phase and intervention type filters; the other filters only apply to the institution maps.")
         else:
-            count_map = px.scatter_mapbox(filtered_count_df,
-                                    lat="Latitude",
-                                    lon="Longitude",
-                                    color=radio_display,
-                                    size=radio_display,
-                                    #color_discrete_sequence=color_palette,
-                                    hover_name="Institution",
-                                    mapbox_style="light",
-                                    center={"lat": 38, "lon": -95},
-                                    zoom=2)
-        count_map.update_layout(width=1100, height=600)
-        c1.plotly_chart(count_map, use_container_width=True)
+            if radio_display == "Number of trials by state":
+                c2.markdown("State aggregates are not available; showing the number of ongoing trials by institution instead.")
+                radio_display = "Number of ongoing trials"
+            # Map view -- nearby institutions are grouped into one marker per grid cell below full-detail zoom
+            map_center = {"lat": near_lat, "lon": near_lon} if near_me else {"lat": 38, "lon": -95}
+            map_zoom = c2.slider("Zoom:", min_value=2, max_value=10, value=6 if near_me else 2)
+
+            # Plot map
+            filtered_count_df = filter_dataset(us_study_data,
+                          intervention,
+                          radio_display,
+                           "count")
+            if radio_display == "Trial enrollment status":
+                filtered_count_df = spatial.aggregate_points(filtered_count_df, map_zoom, "Enrollment", by=[radio_display])
+            else:
+                filtered_count_df = spatial.aggregate_points(filtered_count_df, map_zoom, radio_display)
+            # Color palette type needs to change depending on what's displayed
+            if radio_display == "Trial enrollment status":
+                count_map = px.scatter_mapbox(filtered_count_df,
+                                lat="Latitude",
+                                lon="Longitude",
+                                color=radio_display,
+                                size="Enrollment",
+                                hover_name="Institution",
+                                mapbox_style="light",
+                                center=map_center,
+                                zoom=map_zoom)
+            else:
+                count_map = px.scatter_mapbox(filtered_count_df,
+                                        lat="Latitude",
+                                        lon="Longitude",
+                                        color=radio_display,
+                                        size=radio_display,
+                                        #color_discrete_sequence=color_palette,
+                                        hover_name="Institution",
+                                        mapbox_style="light",
+                                        center=map_center,
+                                        zoom=map_zoom)
+            count_map.update_layout(width=1100, height=600)
+            c1.plotly_chart(count_map, use_container_width=True)
 
     # Data table of studies
     if show_data_table:
@@ -225,7 +292,12 @@ def app():
                       intervention,
                       radio_display,
                       "data")
+            if near_me:
+                # nearest site of each trial first
+                cols_to_keep = cols_to_keep + ["Distance (miles)"]
             filtered_data_display = filtered_data[cols_to_keep].drop_duplicates()
+            if near_me:
+                filtered_data_display = filtered_data_display.drop_duplicates("NCT Number")
             st.write(filtered_data_display)
             if st.button('Download Dataframe as CSV'):
                 tmp_download_link = download_link(filtered_data_display, 'covid_trials_information.csv', 'Click here to download your data!')
@@ -1,51 +1,55 @@
 import streamlit as st
 import pandas as pd
-import geopandas as gpd
-from shapely import wkt
 import numpy as np
 from datetime import datetime
 import json
 from dateutil.relativedelta import relativedelta
 import viz
+import data_access
+import trial_cube
 
 def app():
     # methods to load and change data
     @st.cache(allow_output_mutation=True)
     def load_datasets():
-        return pd.read_csv("https://media.githubusercontent.com/media/oena/bios823_final_project/master/dashboard/dashboard_data/cleaned_data_for_viz.tsv", sep="\t")
+        # dates are parsed once, and the trials sorted by start date so that filter_dataset finds the date range by binary search
+        df = data_access.load("cleaned_data_for_viz")
+        df = df.assign(**{"Start Date": pd.to_datetime(df["Start Date"], errors="coerce"),
+                          "Completion Date": pd.to_datetime(df["Completion Date"], errors="coerce")})
+        # trials without a start date are never in a date range
+        return df.dropna(subset=["Start Date"]).sort_values("Start Date", kind="mergesort").reset_index(drop=True)
         
     def filter_data_for_map(df):
         country_count_df = (
             df[['Location_Country']]
             [df['Location_Country'] != 'NAN'].
             assign(count=1).
-            groupby(['Location_Country']).
+            groupby(['Location_Country'], observed=True).
             agg('sum').
-            sort_values('count', ascending=False).
-            reset_index()
+            sort_values('count', ascending=False)
         )
+        # the canonical country names are one-to-one with the ISO codes the map is joined on
+        if 'Location_Country_ISO' in df.columns:
+            country_count_df['Location_Country_ISO'] = (
+                df.groupby('Location_Country', observed=True)['Location_Country_ISO'].first().astype(object)
+            )
+        country_count_df = country_count_df.reset_index()
         return country_count_df
     
-    @st.cache(allow_output_mutation=True)
-    def load_geo_data():
-        df =pd.read_csv("https://media.githubusercontent.com/media/oena/bios823_final_project/master/dashboard/dashboard_data/cleaned_data_for_map_with_geo.tsv",sep="\t")
-        df['geometry'] = df['geometry'].apply(wkt.loads)
-        gdf = gpd.GeoDataFrame(df, geometry='geometry')
-        return gdf
-    
     def filter_dataset(df, start, end, study_type):
-        df = (
-            df[df['Start Date'].apply(pd.to_datetime) > pd.to_datetime(start)]
-            [df['Completion Date'].apply(pd.to_datetime) < pd.to_datetime(end)]
-        )
+        # trials starting after `start` are a suffix of the sorted start dates; completing before `end` is the
+        # only upper bound (a few records complete before they start)
+        start, end = pd.Timestamp(start).to_datetime64(), pd.Timestamp(end).to_datetime64()
+        df = df.iloc[df['Start Date'].to_numpy().searchsorted(start, side="right"):]
+        df = df[df['Completion Date'].to_numpy() < end]
         if study_type=="All":
             return df
         else:
             return df[df["Study Type"]==study_type]
         
-    # load in data
-    df_origin = load_datasets()
-    df = df_origin.copy()
+    # load in data -- the precomputed count cube when it has been built, the trials otherwise
+    cube = trial_cube.load_cube()
+    df = load_datasets() if cube is None else None
 
     # sidebar control
     st.sidebar.subheader("Choose time interval:")
@@ -65,14 +69,18 @@ def app():
         sort_by = st.sidebar.radio("Bar chart X axis's order:", options=["Count of trial's order", "Attribute's order"])
     
     # filter data
-    df = filter_dataset(df, start, end, study_type)
-    map_data = filter_data_for_map(df)
-    gdf = load_geo_data().drop(columns="count").merge(map_data, left_on='ADMIN', right_on='Location_Country', how='left').sort_values('count', ascending=False)
+    if cube is not None:
+        # the map, the total and the charts are rolled up from the cube, whatever the number of trials
+        map_data = trial_cube.country_counts(cube, start, end, study_type)
+        total_trials = int(trial_cube.select(cube, start, end, study_type)["count"].sum())
+    else:
+        df = filter_dataset(df, start, end, study_type)
+        map_data = filter_data_for_map(df)
+        total_trials = df.shape[0]
     
     # title
     st.title("How COVID-19 trials going on all over the world?")
 
-    total_trials = df.shape[0]
     st.header(f'Total trials of {study_type.lower()} study type(s) from {start} to {end}: **{total_trials}**')
     
     with st.beta_expander("Click here to expand more details about this page"):
@@ -111,6 +119,7 @@ def app():
                                     format_func=options_show)
                                     
         advanced_select = c2.checkbox("Select country")
+        countries = None
         if advanced_select:
             map_data.shape[0]
             number_to_display = c2.number_input("Select top countires to display", min_value = 1, max_value = map_data.shape[0], value = 5, step = 1)
@@ -118,22 +127,18 @@ def app():
     .Location_Country.to_list(), default = map_data.head(number_to_display)
     .Location_Country.to_list())
     
-            countries_select_df = [x in countries for x in df.Location_Country]
-            df["if_select"] = countries_select_df
+            if df is not None:
+                countries_select_df = [x in countries for x in df.Location_Country]
+                df["if_select"] = countries_select_df
+                df = df[df["if_select"] == True]
             countries_select_map_data = [x in countries for x in map_data.Location_Country]
             map_data["if_select"] = countries_select_map_data
-            countries_select_gdf = [x in countries for x in gdf.ADMIN]
-            gdf["if_select"] = countries_select_gdf
-            
-            df = df[df["if_select"] == True]
 
             map_data = map_data[map_data["if_select"] == True].head(number_to_display)
-
-            gdf = gdf[gdf["if_select"] == True].head(number_to_display)
                 
         show_table = c2.checkbox("Show table")
         
-        c1.plotly_chart(viz.get_country_plot(map_data, gdf, center=radio_display), use_container_width=True)
+        c1.plotly_chart(viz.get_country_plot(map_data, center=radio_display), use_container_width=True)
         c1.write(f'Total trials in selected countries: **{sum(map_data["count"])}**')
         c1.write("*\*Note: total trials in all countries may differ from total trials in all records since some trial records don't have country info.*")
         if show_table:
@@ -149,15 +154,18 @@ def app():
 
         c3, c4 = st.beta_columns([5,5])
 
+        # counts of the displayed attribute in the selected range, study type and countries
+        counts = None if cube is None else trial_cube.attribute_counts(cube, start, end, study_type, attribute_display, countries)
+
         if attribute_display == "Duration":
             if sort_by == "Count of trial's order":
                 sort_by = "count"
             else:
                 sort_by = "Trial_Duration"
             # bar plot
-            bar_plot = viz.get_trail_duration_plot(df=df, sort_by=sort_by, type="bar")
+            bar_plot = viz.get_trail_duration_plot(df=df, sort_by=sort_by, type="bar", counts=counts)
             # pie plot
-            pie_plot = viz.get_trail_duration_plot(df=df, sort_by=sort_by, type="pie")
+            pie_plot = viz.get_trail_duration_plot(df=df, sort_by=sort_by, type="pie", counts=counts)
 
         elif attribute_display == "Enrollment":
             if sort_by == "Count of trial's order":
@@ -165,15 +173,15 @@ def app():
             else:
                 sort_by = "Enrollment"
             # bar plot
-            bar_plot = viz.get_enrollment_plot(df=df, sort_by=sort_by, type="bar")
+            bar_plot = viz.get_enrollment_plot(df=df, sort_by=sort_by, type="bar", counts=counts)
             # pie plot
-            pie_plot = viz.get_enrollment_plot(df=df, sort_by=sort_by, type="pie")
+            pie_plot = viz.get_enrollment_plot(df=df, sort_by=sort_by, type="pie", counts=counts)
 
         else:
             # bar plot
-            bar_plot = viz.get_cat_plot(df=df, var=attribute_display, type="bar")
+            bar_plot = viz.get_cat_plot(df=df, var=attribute_display, type="bar", counts=counts)
             # pie plot
-            pie_plot = viz.get_cat_plot(df=df, var=attribute_display, type="pie")
+            pie_plot = viz.get_cat_plot(df=df, var=attribute_display, type="pie", counts=counts)
 
             
         bar_plot.update_layout(margin={"r": 0, "t": 30, "l": 0, "b": 0},
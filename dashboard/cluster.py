@@ -7,16 +7,25 @@ import sqlite3
 
 import plotly.express as px
 
+import data_access
+
+# the best KModes parameters found by `get_cluster`, keyed by the features and a hash of their values
+_best_params = {}
+
 def get_data_for_cluster():
-    return pd.read_csv("https://media.githubusercontent.com/media/oena/bios823_final_project/master/dashboard/dashboard_data/cleaned_data_for_cluster.tsv", sep="\t",index_col=0)
+    """
+    this function load the clustering features through `data_access`, which keeps them in memory: later calls return
+    the same data frame, so it must not be modified in place
+    """
+    return data_access.load("cleaned_data_for_cluster")
 
-def choose_feature(df=get_data_for_cluster(), feature_type="basic info"):
+def choose_feature(df=None, feature_type="basic info"):
     """
     this function do cluster for trials according to specified cols
     Parameters
     ----------
     df : pandas.DataFrame
-        data frame of features that used to cluster
+        data frame of features that used to cluster, `get_data_for_cluster()` if None
     feature_type: str
         which set of features we what to ues
     Returns
@@ -40,21 +49,35 @@ def choose_feature(df=get_data_for_cluster(), feature_type="basic info"):
         "intervention" : intervention_cols
     }
 
+    if df is None:
+        df = get_data_for_cluster()
     df_ = df[feature_set[feature_type]]
 
     return df_
 
-def get_cluster(df=choose_feature()):
+def get_cluster(df=None):
     """
-    this function choose the best number of cluster and return an cluster algo
+    this function choose the best number of cluster and return an cluster algo; the search fits 18 models, so its
+    result is remembered for each set of features and reused as long as their values are unchanged
     Parameters
     ----------
     df : pandas.DataFrame
-        data frame of features that used to cluster
+        data frame of features that used to cluster, `choose_feature()` if None
     Returns
     ----------
     km:
-        the cluster algo with best number of cluster
+        the cluster algo with best number of cluster (not fitted yet)
+    """
+    if df is None:
+        df = choose_feature()
+    key = (tuple(df.columns), int(pd.util.hash_pandas_object(df).sum()))
+    if key not in _best_params:
+        _best_params[key] = _search_cluster_params(df)
+    return KModes(**_best_params[key], n_init = 1, random_state=1, verbose=0)
+
+def _search_cluster_params(df):
+    """
+    this function fit KModes for every number of cluster and init, and return the parameters of `get_cluster`
     """
     # choosing best number of cluster
     hyperparams = {
@@ -82,20 +105,17 @@ def get_cluster(df=choose_feature()):
     best_para = min(para_cost,key=para_cost.get)
     best_para_dict = {"n_clusters":best_para[1], "init":best_para[0]}
 
-    # fit model
-    km = KModes(**best_para_dict, n_init = 1, random_state=1, verbose=0)
+    return best_para_dict
 
-    return km
-    
-def get_clustered_data(km=get_cluster(), df=choose_feature()):
+def get_clustered_data(km=None, df=None):
     """
     this function predict cluster of data and combine it with origin df
     Parameters
     ----------
     km
-        a kmode cluster algo
+        a kmode cluster algo, `get_cluster(df)` if None
     df : pandas.DataFrame
-        data frame of features that used to cluster
+        data frame of features that used to cluster, `choose_feature()` if None
     Returns
     ----------
     df_with_cluster:
@@ -103,6 +123,10 @@ def get_clustered_data(km=get_cluster(), df=choose_feature()):
     cluster_centroids
     cluster_labels
     """
+    if df is None:
+        df = choose_feature()
+    if km is None:
+        km = get_cluster(df)
     fit_clusters = km.fit_predict(df)
     cluster_centroids = pd.DataFrame(km.cluster_centroids_)
     cluster_centroids.columns = df.columns
@@ -112,13 +136,13 @@ def get_clustered_data(km=get_cluster(), df=choose_feature()):
     df_with_cluster = df.reset_index().merge(cluster_labels, left_index=True, right_index=True).set_index("NCT Number")
     return df_with_cluster, cluster_centroids, cluster_labels
 
-def plot_cluster(df_with_cluster=get_clustered_data()[0], feature="Study Type"):
+def plot_cluster(df_with_cluster=None, feature="Study Type"):
     """
     this function plot how categories distributed in each cluster for a specific feature
     Parameters
     ----------
     df_with_cluster:
-        the df with predicted cluster
+        the df with predicted cluster, `get_clustered_data()[0]` if None
     feature: str
         which feature to display, this feature must be in df
     Returns
@@ -126,7 +150,9 @@ def plot_cluster(df_with_cluster=get_clustered_data()[0], feature="Study Type"):
     plot:
         the plot demonstrate how category distributed in each cluster for a specific feature
     """
-    df_count_cluster = df_with_cluster.assign(count=1).groupby(['Cluster Predicted',feature]).agg({"count":'count'}).reset_index()
+    if df_with_cluster is None:
+        df_with_cluster = get_clustered_data()[0]
+    df_count_cluster = df_with_cluster.assign(count=1).groupby(['Cluster Predicted',feature], observed=True).agg({"count":'count'}).reset_index()
 
     plot = px.bar(df_count_cluster,
                   x="Cluster Predicted",
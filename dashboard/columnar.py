@@ -0,0 +1,77 @@
+import os
+
+import pyarrow.feather as feather
+
+data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dashboard_data")
+
+
+def columnar_path(name):
+    """
+    this function return the path of the columnar (Arrow IPC / Feather) copy of a dashboard dataset
+    Parameters
+    ----------
+    name : str
+        dataset name, e.g. "cleaned_data_for_viz"
+    Returns
+    ----------
+    path:
+        the path of dashboard_data/<name>.feather
+    """
+    return os.path.join(data_dir, name + ".feather")
+
+
+def has_columnar(name):
+    """
+    this function check whether the columnar copy of a dataset has been built
+    """
+    return os.path.exists(columnar_path(name))
+
+
+def read_columnar(name, columns=None):
+    """
+    this function memory-map the columnar copy of a dataset (written by data_cleaning/write_columnar.py) and
+    convert it to a data frame, keeping its dtypes
+    Parameters
+    ----------
+    name : str
+        dataset name, e.g. "cleaned_data_for_viz"
+    columns : list
+        only read these columns; None to read all of them
+    Returns
+    ----------
+    df:
+        the data frame, with categoricals, datetimes and the index as they were written
+    """
+    table = feather.read_table(columnar_path(name), memory_map=True)
+    if columns is not None:
+        # keep the stored index columns, so that the index is restored as well
+        index_columns = [c for c in table.schema.pandas_metadata["index_columns"] if isinstance(c, str)]
+        table = feather.read_table(columnar_path(name), columns=index_columns + list(columns), memory_map=True)
+    return table.to_pandas()
+
+
+def read_geo_columnar(name, columns=None, geometry_column="geometry"):
+    """
+    this function read the columnar copy of a geo dataset, whose geometry is stored as WKB
+    Parameters
+    ----------
+    name : str
+        dataset name, e.g. "cleaned_data_for_map_with_geo"
+    columns : list
+        only read these columns (the geometry column is always read); None to read all of them
+    geometry_column : str
+        the name of the WKB geometry column
+    Returns
+    ----------
+    gdf:
+        the geo data frame
+    """
+    # geo dependencies are only needed by the geo datasets
+    import geopandas as gpd
+    from shapely import wkb
+
+    if columns is not None and geometry_column not in columns:
+        columns = list(columns) + [geometry_column]
+    df = read_columnar(name, columns)
+    df[geometry_column] = [wkb.loads(g) if g is not None else None for g in df[geometry_column]]
+    return gpd.GeoDataFrame(df, geometry=geometry_column)
@@ -0,0 +1,128 @@
+import functools
+
+import numpy as np
+import pyarrow.feather as feather
+from shapely import wkb, wkt
+from shapely.geometry import mapping
+
+import columnar
+import data_access
+
+# the least detailed geometry level good enough below each zoom, from the least to the most detailed
+zoom_levels = [(1, "coarse"),
+               (2.5, "medium"),
+               (float("inf"), "fine")]
+
+# decimals kept in the GeoJSON coordinates (about 100 m), far below what the simplification keeps anyway
+coordinate_decimals = 3
+
+
+def level_for_zoom(zoom):
+    """
+    this function pick the geometry level to draw at a mapbox zoom
+    Parameters
+    ----------
+    zoom : float
+        the zoom of the map
+    Returns
+    ----------
+    level:
+        "coarse", "medium" or "fine"
+    """
+    for max_zoom, level in zoom_levels:
+        if zoom < max_zoom:
+            return level
+
+
+def _round_coordinates(coordinates):
+    if isinstance(coordinates[0], (int, float)):
+        return [round(c, coordinate_decimals) for c in coordinates]
+    return [_round_coordinates(c) for c in coordinates]
+
+
+def to_feature_collection(admins, geometries, iso_codes=None):
+    """
+    this function build a GeoJSON feature collection of the country outlines
+    Parameters
+    ----------
+    admins : list
+        the ADMIN name of each country
+    geometries : list
+        the shapely geometry of each country
+    iso_codes : list
+        the ISO (ADM0_A3) code of each country, or None when the source has no codes
+    Returns
+    ----------
+    geojson:
+        the feature collection; each feature has the 'ADMIN' property and, when known, the 'iso_a3' property
+    """
+    if iso_codes is None:
+        iso_codes = [None] * len(admins)
+    features = []
+    for admin, geometry, iso_a3 in zip(admins, geometries, iso_codes):
+        if geometry is None or geometry.is_empty:
+            continue
+        geometry = mapping(geometry)
+        properties = {"ADMIN": admin} if iso_a3 is None else {"ADMIN": admin, "iso_a3": iso_a3}
+        features.append({"type": "Feature",
+                         "properties": properties,
+                         "geometry": {"type": geometry["type"],
+                                      "coordinates": _round_coordinates(geometry["coordinates"])}})
+    return {"type": "FeatureCollection", "features": features}
+
+
+@functools.lru_cache(maxsize=None)
+def load_country_geojson(level="medium"):
+    """
+    this function build the GeoJSON feature collection of the country outlines at a geometry level, once per level
+    Parameters
+    ----------
+    level : str
+        "coarse", "medium" or "fine"
+    Returns
+    ----------
+    geojson:
+        the feature collection; it is cached, so every rerun reuses the same object
+    """
+    if columnar.has_columnar("country_geometry"):
+        table = feather.read_table(columnar.columnar_path("country_geometry"),
+                                   columns=["iso_a3", "ADMIN", "geometry_" + level], memory_map=True)
+        geometries = [wkb.loads(g) if g is not None else None for g in table.column("geometry_" + level).to_pylist()]
+        return to_feature_collection(table.column("ADMIN").to_pylist(), geometries, table.column("iso_a3").to_pylist())
+
+    # without the prebuilt levels, every level falls back to the full geometry of the map dataset
+    gdf = data_access.load("cleaned_data_for_map_with_geo")
+    # the columnar copy stores the geometry as WKB, the TSV as WKT
+    geometries = [wkb.loads(g) if isinstance(g, bytes) else wkt.loads(g) if isinstance(g, str) else None
+                  for g in gdf["geometry"]]
+    iso_codes = list(gdf["ADM0_A3"]) if "ADM0_A3" in gdf.columns else None
+    return to_feature_collection(list(gdf["ADMIN"]), geometries, iso_codes)
+
+
+def has_iso_codes(level="medium"):
+    """
+    this function check whether the features of a level carry the 'iso_a3' property
+    """
+    features = load_country_geojson(level)["features"]
+    return len(features) > 0 and "iso_a3" in features[0]["properties"]
+
+
+@functools.lru_cache(maxsize=None)
+def feature_values(level="medium", prop="ADMIN"):
+    """
+    this function return a property of the features of `load_country_geojson(level)`, in feature order
+    Parameters
+    ----------
+    level : str
+        "coarse", "medium" or "fine"
+    prop : str
+        "ADMIN" or "iso_a3"
+    Returns
+    ----------
+    values:
+        a read-only array, shared by every plot of the level
+    """
+    values = np.array([feature["properties"].get(prop) for feature in load_country_geojson(level)["features"]],
+                      dtype=object)
+    values.setflags(write=False)
+    return values
@@ -0,0 +1,223 @@
+import glob
+import hashlib
+import os
+import sqlite3
+import urllib.request
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+import columnar
+
+media_url = "https://media.githubusercontent.com/media/oena/bios823_final_project/master/dashboard/dashboard_data/"
+raw_url = "https://raw.githubusercontent.com/oena/bios823_final_project/master/dashboard/dashboard_data/"
+
+# every dataset the pages read: its file in dashboard_data/, the URL of its published copy (None if it is not
+# published) and the `pd.read_csv` options of the file
+datasets = {
+    "cleaned_data_for_viz": {"file": "cleaned_data_for_viz.tsv", "url": media_url + "cleaned_data_for_viz.tsv",
+                             "read_csv": {"sep": "\t"}},
+    "cleaned_data_for_cluster": {"file": "cleaned_data_for_cluster.tsv",
+                                 "url": media_url + "cleaned_data_for_cluster.tsv",
+                                 "read_csv": {"sep": "\t", "index_col": 0}},
+    "cleaned_data_for_map_with_geo": {"file": "cleaned_data_for_map_with_geo.tsv",
+                                      "url": media_url + "cleaned_data_for_map_with_geo.tsv",
+                                      "read_csv": {"sep": "\t"}},
+    "cleaned_us_covid_studies_with_geo_092020": {"file": "cleaned_us_covid_studies_with_geo_092020.tsv",
+                                                 "url": media_url + "cleaned_us_covid_studies_with_geo_092020.tsv",
+                                                 "read_csv": {"sep": "\t"}},
+    "us_state_counts": {"file": "us_state_counts.tsv", "url": None, "read_csv": {"sep": "\t"}},
+    "cleaned_data_for_world_cube": {"file": "cleaned_data_for_world_cube.tsv", "url": None,
+                                    "read_csv": {"sep": "\t", "parse_dates": ["start_month", "completion_month"],
+                                                 "keep_default_na": False}},
+    "X_train": {"file": "X_train.csv", "url": raw_url + "X_train.csv", "read_csv": {}},
+    "X_test": {"file": "X_test.csv", "url": raw_url + "X_test.csv", "read_csv": {}},
+    "y_train": {"file": "y_train.csv", "url": raw_url + "y_train.csv", "read_csv": {}},
+    "y_test": {"file": "y_test.csv", "url": raw_url + "y_test.csv", "read_csv": {}},
+    "compare_model_df": {"file": "compare_model_df.csv", "url": raw_url + "compare_model_df.csv", "read_csv": {}},
+}
+
+# the backends tried in order: "local" (the columnar copy, then the file in dashboard_data/), "sqlite" (a table
+# named after the dataset in `sqlite_path`) and "remote" (the published copy, downloaded once into `cache_dir`);
+# e.g. DASHBOARD_DATA_BACKEND=local,sqlite for an air-gapped deployment
+backends = [b.strip() for b in os.environ.get("DASHBOARD_DATA_BACKEND", "local,remote").split(",") if b.strip()]
+sqlite_path = os.environ.get("DASHBOARD_DB", os.path.join(columnar.data_dir, "dashboard.db"))
+cache_dir = os.environ.get("DASHBOARD_CACHE_DIR", os.path.join(columnar.data_dir, ".cache"))
+
+# dataset name -> (source, data frame) of the last load in this process
+_memory = {}
+
+
+def _signature(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _is_lfs_pointer(path):
+    # a checkout without git-lfs holds small pointer files instead of the data
+    with open(path, "rb") as f:
+        return f.read(24) == b"version https://git-lfs."
+
+
+def _sqlite_has_table(name):
+    if not os.path.exists(sqlite_path):
+        return False
+    conn = sqlite3.connect(sqlite_path)
+    try:
+        return conn.execute("select 1 from sqlite_master where type = 'table' and name = ?", (name,)).fetchone() is not None
+    finally:
+        conn.close()
+
+
+def _download(name):
+    path = os.path.join(cache_dir, datasets[name]["file"])
+    if not os.path.exists(path):
+        os.makedirs(cache_dir, exist_ok=True)
+        urllib.request.urlretrieve(datasets[name]["url"], path + ".part")
+        os.replace(path + ".part", path)
+    return path
+
+
+def locate(name):
+    """
+    this function find where a dataset is read from, trying the backends in order
+    Parameters
+    ----------
+    name : str
+        dataset name, a key of `datasets`
+    Returns
+    ----------
+    source:
+        (kind, path, signature), where kind is "feather", "file" or "sqlite" and the signature is the
+        (mtime, size) of the path; only the "remote" backend may touch the network, to download a missing copy
+    """
+    for backend in backends:
+        if backend == "local":
+            if columnar.has_columnar(name):
+                path = columnar.columnar_path(name)
+                return "feather", path, _signature(path)
+            path = os.path.join(columnar.data_dir, datasets[name]["file"])
+            if os.path.exists(path) and not _is_lfs_pointer(path):
+                return "file", path, _signature(path)
+        elif backend == "sqlite":
+            if _sqlite_has_table(name):
+                return "sqlite", sqlite_path, _signature(sqlite_path)
+        elif backend == "remote":
+            if datasets[name]["url"] is not None:
+                path = _download(name)
+                return "file", path, _signature(path)
+        else:
+            raise ValueError(f"unknown data backend {backend!r}")
+    raise FileNotFoundError(f"dataset {name!r} is not available from the {', '.join(backends)} backend(s)")
+
+
+def _content_hash(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def _parse(name, kind, path):
+    options = datasets[name]["read_csv"]
+    if kind == "file":
+        return pd.read_csv(path, **options)
+    conn = sqlite3.connect(path)
+    try:
+        df = pd.read_sql(f'select * from "{name}"', conn)
+        columns = [row[0] for row in conn.execute('select "name" from "dataset_columns" where "dataset" = ? '
+                                                  'order by "position"', (name,))]
+    except sqlite3.OperationalError:
+        # a table that was not written by `export_to_sqlite` (no "dataset_columns") keeps its column names
+        columns = []
+    finally:
+        conn.close()
+    if len(columns) == df.shape[1]:
+        df.columns = columns
+    # tables exported by `export_to_sqlite` keep the index of the file as their first column
+    return df.set_index(df.columns[0]) if "index_col" in options else df
+
+
+def _load_through_disk_cache(name, kind, path):
+    # the parsed frame is kept as Feather next to the other cached files, keyed by the content of its source, so
+    # touching a file or restarting the app does not parse it again
+    cache_path = os.path.join(cache_dir, f"{name}-{kind}-{_content_hash(path)}.feather")
+    if os.path.exists(cache_path):
+        return feather.read_table(cache_path, memory_map=True).to_pandas()
+    df = _parse(name, kind, path)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        feather.write_feather(pa.Table.from_pandas(df), cache_path + ".part", compression="uncompressed")
+        os.replace(cache_path + ".part", cache_path)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError, OSError):
+        # mixed-type columns cannot be stored as Arrow; such a dataset is parsed again on each new source
+        return df
+    for stale in glob.glob(os.path.join(cache_dir, f"{name}-{kind}-*.feather")):
+        if stale != cache_path:
+            os.remove(stale)
+    return df
+
+
+def load(name):
+    """
+    this function return a dataset from the first backend that has it, through an in-memory and an on-disk cache
+    Parameters
+    ----------
+    name : str
+        dataset name, a key of `datasets`
+    Returns
+    ----------
+    df:
+        the data frame; it is shared by every caller until its source changes (new mtime or size), so it must be
+        copied before being modified in place
+    """
+    source = locate(name)
+    cached = _memory.get(name)
+    if cached is not None and cached[0] == source:
+        return cached[1]
+    kind, path, _ = source
+    if kind == "feather":
+        df = columnar.read_columnar(name)
+    else:
+        df = _load_through_disk_cache(name, kind, path)
+    _memory[name] = (source, df)
+    return df
+
+
+def export_to_sqlite(path=sqlite_path, names=None):
+    """
+    this function copy datasets into one SQLite file, e.g. to ship them to a host without network access
+    Parameters
+    ----------
+    path : str
+        the SQLite file written (tables are replaced)
+    names : list
+        the datasets to copy; None to copy all of them
+    """
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute('create table if not exists "dataset_columns" ("dataset" TEXT, "position" INTEGER, "name" TEXT, '
+                     'primary key ("dataset", "position"))')
+        for name in names if names is not None else datasets:
+            df = load(name)
+            if "index_col" in datasets[name]["read_csv"]:
+                df = df.reset_index()
+            # SQLite column names are case-insensitive (X_train has both "Gender_ALL" and "Gender_All"), so the
+            # names are stored by position and the table gets names that are unique whatever their case
+            lowered = [str(column).lower() for column in df.columns]
+            stored = [column if lowered.count(lowered[i]) == 1 else f"{column}__{i}" for i, column in enumerate(df.columns)]
+            df.set_axis(stored, axis=1).to_sql(name, conn, if_exists="replace", index=False)
+            conn.execute('delete from "dataset_columns" where "dataset" = ?', (name,))
+            conn.executemany('insert into "dataset_columns" values (?, ?, ?)',
+                             [(name, i, str(column)) for i, column in enumerate(df.columns)])
+        conn.commit()
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    # e.g. `python data_access.py dashboard_data/dashboard.db` from this directory
+    import sys
+    export_to_sqlite(sys.argv[1] if len(sys.argv) > 1 else sqlite_path)
@@ -0,0 +1,83 @@
+import importlib
+import logging
+import os
+import subprocess
+import sys
+import time
+
+# the time (in seconds) and the growth of the peak RSS (in MB) of the first import of each page module, in this process
+import_report = {}
+
+logger = logging.getLogger(__name__)
+
+
+def _peak_rss_mb():
+    # the resource module only exists on Unix; elsewhere the memory is not reported
+    try:
+        import resource
+    except ImportError:
+        return float("nan")
+    # ru_maxrss is in kilobytes on Linux (bytes on macOS, where this over-reports by 1024x)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load_page(module_name):
+    """
+    this function import a page module the first time it is selected, and record how long that took
+    Parameters
+    ----------
+    module_name : str
+        the name of the page module, e.g. "app_world_trial"
+    Returns
+    ----------
+    page:
+        the imported module; later calls return it from `sys.modules` without importing it again
+    """
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    start, rss = time.perf_counter(), _peak_rss_mb()
+    page = importlib.import_module(module_name)
+    import_report[module_name] = {"seconds": time.perf_counter() - start, "peak RSS growth (MB)": _peak_rss_mb() - rss}
+    logger.debug("imported %s in %.2fs (+%.0f MB peak RSS)", module_name, import_report[module_name]["seconds"],
+                 import_report[module_name]["peak RSS growth (MB)"])
+    return page
+
+
+def cold_import_report(module_names):
+    """
+    this function import each page module in a fresh interpreter, so that the dependencies a page shares with another
+    one are counted for both
+    Parameters
+    ----------
+    module_names : list
+        the names of the page modules
+    Returns
+    ----------
+    report:
+        dict of the module name to its import time (in seconds) and the peak RSS of the interpreter (in MB)
+    """
+    probe = ("import time; start = time.perf_counter(); import {name}; seconds = time.perf_counter() - start; "
+             "import page_loader; print(seconds, page_loader._peak_rss_mb())")
+    report = {}
+    for name in module_names:
+        result = subprocess.run([sys.executable, "-c", probe.format(name=name)], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        if result.returncode != 0:
+            # a child killed by a signal may leave no stderr at all
+            error = (result.stderr.strip().splitlines() or [f"exit {result.returncode}"])[-1]
+            report[name] = {"seconds": None, "peak RSS (MB)": None, "error": error}
+            continue
+        seconds, rss = result.stdout.split()[-2:]
+        report[name] = {"seconds": float(seconds), "peak RSS (MB)": float(rss)}
+    return report
+
+
+if __name__ == "__main__":
+    # startup cost of every page, e.g. `python page_loader.py` from this directory
+    names = sys.argv[1:] or ["streamlit", "app_intro", "app_world_trial", "app_us_trial", "app_cluster",
+                             "app_predict_activeness"]
+    for name, row in cold_import_report(names).items():
+        if row["seconds"] is None:
+            print(f"{name:<25} failed: {row['error']}")
+        else:
+            print(f"{name:<25} {row['seconds']:6.2f}s {row['peak RSS (MB)']:8.0f} MB")
@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import BallTree
+
+earth_radius_miles = 3958.8
+
+
+class SiteIndex:
+    """
+    a haversine BallTree over the geocoded trial sites, built once and queried for the sites within a radius
+    """
+
+    def __init__(self, sites, lat="lat", lon="lon"):
+        """
+        Parameters
+        ----------
+        sites : pandas.DataFrame
+            one row per site, with latitude and longitude in degrees; rows without coordinates are skipped
+        lat, lon : str
+            the names of the coordinate columns
+        """
+        located = sites[[lat, lon]].dropna()
+        self.labels = located.index
+        self.tree = BallTree(np.radians(located.to_numpy(dtype=float)), metric="haversine")
+
+    def within(self, lat, lon, radius_miles):
+        """
+        this function find the sites within a radius of a point
+        Parameters
+        ----------
+        lat, lon : float
+            the point, in degrees
+        radius_miles : float
+            the radius of the search, in miles
+        Returns
+        ----------
+        distances:
+            pandas.Series of the distance in miles, indexed by the labels of the matching rows of `sites`,
+            nearest first
+        """
+        indices, distances = self.tree.query_radius(np.radians([[lat, lon]]), r=radius_miles / earth_radius_miles,
+                                                    return_distance=True, sort_results=True)
+        return pd.Series(distances[0] * earth_radius_miles, index=self.labels[indices[0]], name="Distance (miles)")
+
+
+def trials_within(sites, index, lat, lon, radius_miles):
+    """
+    this function return the trials with at least one site within a radius of a point, sorted by distance
+    Parameters
+    ----------
+    sites : pandas.DataFrame
+        the sites the index was built on, with the "NCT Number" column
+    index : SiteIndex
+        the index over `sites`
+    lat, lon : float
+        the point, in degrees
+    radius_miles : float
+        the radius of the search, in miles
+    Returns
+    ----------
+    trials:
+        the nearest site of each matching trial, with its "Distance (miles)", nearest first
+    """
+    distances = index.within(lat, lon, radius_miles)
+    nearest = sites.loc[distances.index].assign(**{"Distance (miles)": distances.to_numpy()})
+    return nearest.drop_duplicates("NCT Number")
+
+
+def grid_cell_degrees(zoom, cell_pixels=32):
+    """
+    this function return the size in degrees of a grid cell covering about `cell_pixels` on screen at a mapbox zoom
+    (a 512 px mapbox tile spans 360 / 2 ** zoom degrees of longitude)
+    """
+    return 360 / 2 ** zoom * cell_pixels / 512
+
+
+def aggregate_points(points, zoom, value, lat="Latitude", lon="Longitude", name="Institution", by=None,
+                     cell_pixels=32, full_detail_zoom=8):
+    """
+    this function bin the map points into a zoom-dependent grid and return one weighted centroid per cell, so the
+    number of markers depends on the view rather than on the number of points
+    Parameters
+    ----------
+    points : pandas.DataFrame
+        one row per point, with the coordinate, name and value columns
+    zoom : float
+        the zoom of the map
+    value : str
+        the column summed in each cell; it also weights the centroid
+    lat, lon, name : str
+        the coordinate and label columns
+    by : list
+        extra columns kept apart inside a cell (e.g. a status shown by color)
+    cell_pixels : int
+        the approximate size of a cell on screen
+    full_detail_zoom : float
+        from this zoom on, the points are returned as they are
+    Returns
+    ----------
+    aggregated:
+        the same columns as `points`; a cell with several points is labelled "<n> institutions"
+    """
+    if zoom >= full_detail_zoom or points.shape[0] == 0:
+        return points
+    by = list(by) if by is not None else []
+    cell = grid_cell_degrees(zoom, cell_pixels)
+
+    weights = points[value].astype(float).clip(lower=0)
+    # points with no weight still count towards the centroid of their cell
+    weights = weights.where(weights > 0, 1e-9)
+    binned = points.assign(_cell_lat=np.floor(points[lat] / cell), _cell_lon=np.floor(points[lon] / cell),
+                           _w=weights, _wlat=points[lat] * weights, _wlon=points[lon] * weights)
+    grouped = binned.groupby(["_cell_lat", "_cell_lon"] + by, observed=True, sort=False)
+    aggregated = grouped.agg(**{value: (value, "sum"), "_w": ("_w", "sum"), "_wlat": ("_wlat", "sum"),
+                                "_wlon": ("_wlon", "sum"), "_n": (name, "size"), "_first": (name, "first")})
+    aggregated[lat] = aggregated["_wlat"] / aggregated["_w"]
+    aggregated[lon] = aggregated["_wlon"] / aggregated["_w"]
+    aggregated[name] = aggregated["_first"].where(aggregated["_n"] == 1,
+                                                  aggregated["_n"].astype(str) + " institutions")
+    return aggregated.reset_index()[points.columns]
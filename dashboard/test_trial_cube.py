@@ -0,0 +1,50 @@
+import datetime
+import importlib.util
+import os
+
+import pandas as pd
+
+import trial_cube
+
+# the cube is built by the ETL module of the same name in data_cleaning/
+_spec = importlib.util.spec_from_file_location(
+    "etl_trial_cube", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data_cleaning", "trial_cube.py"))
+etl_trial_cube = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(etl_trial_cube)
+
+
+def _trials():
+    return pd.DataFrame({
+        "Start Date": pd.to_datetime(["2020-03-01", "2020-06-01", "2023-01-01", "2019-01-01", "2020-05-01"]),
+        # the third trial completes before it starts, and after the end of the range
+        "Completion Date": pd.to_datetime(["2021-01-01", "2021-06-01", "2021-02-01", "2021-01-01", None]),
+        "Study Type": ["INTERVENTIONAL", "OBSERVATIONAL", "INTERVENTIONAL", "INTERVENTIONAL", "INTERVENTIONAL"],
+        "Location_Country": ["FRANCE", "CHINA", "FRANCE", "FRANCE", "CHINA"],
+        "Location_Country_ISO": ["FRA", "CHN", "FRA", "FRA", "CHN"],
+        "Status": ["RECRUITING", "COMPLETED", "RECRUITING", "COMPLETED", "RECRUITING"],
+        "Phases": ["PHASE 1", "PHASE 2", "PHASE 2", None, "PHASE 1"],
+        "Trial_Duration_Category": ["7 - 12 months"] * 5,
+        "Funded Bys": ["INDUSTRY"] * 5,
+        "Enrollment_Category": ["11 - 50"] * 5,
+        "Age": ["ADULT"] * 5,
+    })
+
+
+def _filter_trials(df, start, end):
+    # the row-level predicate of app_world_trial.filter_dataset
+    return df[(df["Start Date"] > pd.Timestamp(start)) & (df["Completion Date"] < pd.Timestamp(end))]
+
+
+def test_rollup_matches_row_filter_with_completion_before_start():
+    trials = _trials()
+    cube = etl_trial_cube.build_trial_cube(trials)
+    start, end = datetime.date(2020, 1, 1), datetime.date(2022, 1, 1)
+    expected = _filter_trials(trials, start, end)
+    assert "2023-01-01" in expected["Start Date"].astype(str).tolist()
+
+    assert trial_cube.select(cube, start, end)["count"].sum() == len(expected)
+    status = trial_cube.attribute_counts(cube, start, end, attribute="Status")
+    assert status.to_dict() == expected["Status"].value_counts().to_dict()
+    countries = trial_cube.country_counts(cube, start, end)
+    assert dict(zip(countries["Location_Country"], countries["count"])) == {"FRANCE": 2, "CHINA": 1}
+    assert trial_cube.select(cube, start, end, study_type="OBSERVATIONAL")["count"].sum() == 1
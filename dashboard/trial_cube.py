@@ -0,0 +1,86 @@
+import pandas as pd
+
+import data_access
+
+
+def load_cube():
+    """
+    this function load the trial count cube built by `data_cleaning/clean_data_for_viz_cluster.py`
+    Returns
+    ----------
+    cube:
+        one row per start month, completion month, study type, country, attribute and value with its `count`, sorted by
+        start month; None if the cube has not been built
+    """
+    try:
+        return data_access.load("cleaned_data_for_world_cube")
+    except FileNotFoundError:
+        return None
+
+
+def select(cube, start, end, study_type="All", attribute="All", countries=None):
+    """
+    this function select the cells of the cube for the trials that start after `start` and complete before `end`,
+    as `app_world_trial.filter_dataset` does on the trials
+    Parameters
+    ----------
+    cube : pandas.DataFrame
+        the cube, from `load_cube`
+    start, end : datetime.date
+        the date range
+    study_type : str
+        a study type, or "All"
+    attribute : str
+        the attribute counted, "All" to count the trials themselves
+    countries : list
+        only keep these countries (Location_Country); None to keep all of them
+    Returns
+    ----------
+    cells:
+        the selected rows of the cube
+    """
+    start, end = pd.Timestamp(start).to_datetime64(), pd.Timestamp(end).to_datetime64()
+    # the cube is sorted by start month, so the cells starting after `start` are a suffix; completing before `end`
+    # is the only upper bound (a few records complete before they start)
+    cells = cube.iloc[cube["start_month"].to_numpy().searchsorted(start, side="right"):]
+    mask = (cells["completion_month"].to_numpy() < end) & (cells["attribute"] == attribute).to_numpy()
+    if study_type != "All":
+        mask &= (cells["Study Type"] == study_type).to_numpy()
+    if countries is not None:
+        mask &= cells["Location_Country"].isin(countries).to_numpy()
+    return cells[mask]
+
+
+def attribute_counts(cube, start, end, study_type="All", attribute="Status", countries=None):
+    """
+    this function roll the cube up to the number of trials per value of an attribute
+    Returns
+    ----------
+    counts:
+        pandas.Series of the counts indexed by value, largest first, like `value_counts` on the trials
+    """
+    cells = select(cube, start, end, study_type, attribute, countries)
+    counts = cells.groupby(cells["value"].astype(object))["count"].sum()
+    return counts[counts > 0].sort_values(ascending=False).rename(None)
+
+
+def country_counts(cube, start, end, study_type="All"):
+    """
+    this function roll the cube up to the number of trials per country, for the map
+    Returns
+    ----------
+    country_count_df:
+        the Location_Country, count and Location_Country_ISO columns, largest count first, without the trials that
+        have no country
+    """
+    cells = select(cube, start, end, study_type)
+    cells = cells[cells["Location_Country"] != "NAN"]
+    country_count_df = (
+        cells.assign(Location_Country=cells["Location_Country"].astype(object),
+                     Location_Country_ISO=cells["Location_Country_ISO"].astype(object).replace("", float("nan"))).
+        groupby("Location_Country").
+        agg(count=("count", "sum"), Location_Country_ISO=("Location_Country_ISO", "first")).
+        sort_values("count", ascending=False).
+        reset_index()
+    )
+    return country_count_df
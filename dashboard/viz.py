@@ -5,26 +5,46 @@ import sqlite3
 
 import numpy as np 
 import pandas as pd
-import geopandas as gpd
 
 import plotly.graph_objs as go
 import plotly.express as px
 
+import country_geometry
+import data_access
+
 
 # get data functions ###################################################################################################
 
 def get_df():
-    return pd.read_csv("https://github.com/oena/bios823_final_project/blob/master/dashboard/dashboard_data/cleaned_data_for_viz.tsv", sep="\t")
+    """
+    this function load the trials data the default plots are drawn from, through `data_access` (so only the first
+    plot called without `df` reads it)
+    """
+    return data_access.load("cleaned_data_for_viz")
 
 # location viz functions ###############################################################################################
 
+# Center of the Plot data
+regions = {
+    'world': {"lat": 45, "lon": 0, 'zoom': 0.75},
+    'europe': {'lat': 50, 'lon': 0, 'zoom': 3},
+    'north_america': {'lat': 40, 'lon': -100, 'zoom': 2},
+    'south_america': {'lat': -15, 'lon': -60, 'zoom': 2},
+    'africa': {'lat': 0, 'lon': 20, 'zoom': 2},
+    'asia': {'lat': 30, 'lon': 100, 'zoom': 2},
+    'oceania': {'lat': -10, 'lon': 130, 'zoom': 2},
+}
+
+
 def get_country_plot(country_count_df,
-                     geo_country_count_df,
                      center="world"):
     """
     this function generate the plot to demonstrate how many trial in the each countries
     Parameters
     ----------
+    country_count_df : pandas.DataFrame
+        the count of trials ('count') by country ('Location_Country_ISO', or 'Location_Country' for data built
+        without ISO codes); only these countries are drawn
     center: str
         the center for the plot, options:
         'world',
@@ -39,35 +59,39 @@ def get_country_plot(country_count_df,
     geo_plot:
         the plot demonstrate how many trial in the each countries
     """
-    # Convert to geojson
-    geo_country_count_json = json.loads(geo_country_count_df.to_json())
-    
-    # Center of the Plot data
-    regions = {
-        'world': {"lat": 45, "lon": 0, 'zoom': 0.75},
-        'europe': {'lat': 50, 'lon': 0, 'zoom': 3},
-        'north_america': {'lat': 40, 'lon': -100, 'zoom': 2},
-        'south_america': {'lat': -15, 'lon': -60, 'zoom': 2},
-        'africa': {'lat': 0, 'lon': 20, 'zoom': 2},
-        'asia': {'lat': 30, 'lon': 100, 'zoom': 2},
-        'oceania': {'lat': -10, 'lon': 130, 'zoom': 2},
-    }
-
-    geo_plot = px.choropleth_mapbox(
-        data_frame=geo_country_count_df,
-        geojson=geo_country_count_json,
-        color='count',
-        locations='ADMIN',
-        featureidkey='properties.ADMIN',
+    # the outlines are simplified for the zoom in use, serialized once per level and shared by every plot;
+    # a rerun only aligns the counts to the (also shared) key array of the features
+    level = country_geometry.level_for_zoom(regions[center]["zoom"])
+    geo_country_json = country_geometry.load_country_geojson(level)
+
+    # countries are matched on their ISO code, or on their name with data built before the country dimension
+    if 'Location_Country_ISO' in country_count_df.columns and country_geometry.has_iso_codes(level):
+        key, prop = 'Location_Country_ISO', 'iso_a3'
+    else:
+        key, prop = 'Location_Country', 'ADMIN'
+    locations = country_geometry.feature_values(level, prop)
+    names = country_geometry.feature_values(level, 'ADMIN')
+
+    counts = country_count_df.groupby(key, observed=True)['count'].sum().reindex(locations).to_numpy()
+    # countries without trials are not drawn, as before
+    has_trials = ~np.isnan(counts)
+
+    geo_plot = go.Figure(go.Choroplethmapbox(
+        geojson=geo_country_json,
+        featureidkey='properties.' + prop,
+        locations=locations[has_trials],
+        z=counts[has_trials],
+        text=names[has_trials],
+        colorscale=px.colors.sequential.YlGnBu,  # make colorscale fix
+        marker_opacity=0.75,
+        colorbar_title="Count of Trials",
+        hovertemplate="Country=%{text}<br>Count of Trials=%{z}<extra></extra>",
+    ))
+    geo_plot.update_layout(
         mapbox_style='carto-positron',  # can change background
-        color_continuous_scale=px.colors.sequential.YlGnBu,  # make colorscale fix
         # we can change our center
-        center={"lat":regions[center]["lat"], "lon":regions[center]["lon"]},
-        zoom=regions[center]["zoom"],
-        opacity=0.75,
-        labels={"ADMIN": "Country",
-                "count": "Count of Trials",
-                },
+        mapbox_center={"lat": regions[center]["lat"], "lon": regions[center]["lon"]},
+        mapbox_zoom=regions[center]["zoom"],
     )
     # the size of figure may need adjust
     geo_plot.update_layout(margin={"r": 0, "t": 10, "l": 0, "b": 0},
@@ -80,23 +104,29 @@ def get_country_plot(country_count_df,
 
 # trial duration functions #############################################################################################
 
-def get_trail_duration_plot(df=get_df(), sort_by="count", type="bar"):
+def get_trail_duration_plot(df=None, sort_by="count", type="bar", counts=None):
     """
     this function generate the plot to demonstrate how trial duration distribute
     Parameters
     ----------
     df : pandas.DataFrame
-        df data frame
+        df data frame, `get_df()` if None
     sort_by : str
         sort by "count" or "Trial_Duration"
     type: str
         the type of the plot, "pie" or "bar"
+    counts : pandas.Series
+        the number of trials per duration category (e.g. from `trial_cube.attribute_counts`); None to count `df`
     Returns
     ----------
     plot:
         the plot demonstrate how trial duration distribute
     """
-    duration_df = df.Trial_Duration_Category.value_counts().to_frame().reset_index()
+    if counts is None:
+        if df is None:
+            df = get_df()
+        counts = df.Trial_Duration_Category.value_counts()
+    duration_df = counts.to_frame().reset_index()
     duration_df.columns = ['Trial_Duration', 'count']
 
     # control bar for how to order the bar chart: 'count' or 'Trial_Duration'
@@ -144,23 +174,29 @@ def get_trail_duration_plot(df=get_df(), sort_by="count", type="bar"):
 
 # enrollment functions #################################################################################################
 
-def get_enrollment_plot(df=get_df(), sort_by="count", type="bar"):
+def get_enrollment_plot(df=None, sort_by="count", type="bar", counts=None):
     """
     this function generate the plot to demonstrate how enrollment distribute
     Parameters
     ----------
     df : pandas.DataFrame
-        df data frame
+        df data frame, `get_df()` if None
     sort_by : str
         sort by "count" or "Enrollment"
     type: str
         the type of the plot, "pie" or "bar"
+    counts : pandas.Series
+        the number of trials per enrollment category (e.g. from `trial_cube.attribute_counts`); None to count `df`
     Returns
     ----------
     plot:
         the plot demonstrate how enrollment distribute
     """
-    enroll_df = df.Enrollment_Category.value_counts().to_frame().reset_index()
+    if counts is None:
+        if df is None:
+            df = get_df()
+        counts = df.Enrollment_Category.value_counts()
+    enroll_df = counts.to_frame().reset_index()
     enroll_df.columns = ['Enrollment', 'count']
 
     # control bar for how to order the bar chart: 'count' or 'enroll'
@@ -206,13 +242,13 @@ def get_enrollment_plot(df=get_df(), sort_by="count", type="bar"):
 
 # catgorical plot ######################################################################################################
 
-def get_cat_plot(df=get_df(), var="Status", type="bar"):
+def get_cat_plot(df=None, var="Status", type="bar", counts=None):
     """
     this function generate the plot of categorical variable
     Parameters
     ----------
     df : pandas.DataFrame
-        df data frame
+        df data frame, `get_df()` if None
     var : str
         choose the categorical variable to plot, "Statue", "Age" or "Phases"
     type: str
@@ -221,6 +257,8 @@ def get_cat_plot(df=get_df(), var="Status", type="bar"):
         the lower bound of time range for the plot
     end: datetime
         the upper bound of time range for the plot
+    counts : pandas.Series
+        the number of trials per value of `var` (e.g. from `trial_cube.attribute_counts`); None to count `df`
     Returns
     ----------
     plot:
@@ -233,9 +271,14 @@ def get_cat_plot(df=get_df(), var="Status", type="bar"):
 
     var = vars[var]
 
-    def plot_pie(df, col, title_str):
+    if counts is None:
+        if df is None:
+            df = get_df()
+        counts = df[var[0]].dropna().value_counts()
+
+    def plot_pie(counts, col, title_str):
         # only slice top 11 categories
-        df = df[col].dropna().value_counts().to_frame().reset_index().head(11)
+        df = counts.loc[lambda counts: counts > 0].to_frame().reset_index().head(11)
         df.columns = [col, 'count']
         plot = px.pie(df,
                       values='count',
@@ -246,8 +289,8 @@ def get_cat_plot(df=get_df(), var="Status", type="bar"):
                       )
         return plot
 
-    def plot_bar(df, col, title_str):
-        df = df[col].dropna().value_counts().to_frame().reset_index().head(11)
+    def plot_bar(counts, col, title_str):
+        df = counts.loc[lambda counts: counts > 0].to_frame().reset_index().head(11)
         df.columns = [col, 'count']
         df = df.sort_values('count', ascending=True)
         plot = px.bar(df,
@@ -261,9 +304,9 @@ def get_cat_plot(df=get_df(), var="Status", type="bar"):
         return plot
 
     if type == "bar":
-        plot = plot_bar(df, *var)
+        plot = plot_bar(counts, *var)
     elif type == "pie":
-        plot = plot_pie(df, *var)
+        plot = plot_pie(counts, *var)
 
     return plot
 
@@ -271,12 +314,7 @@ def get_cat_plot(df=get_df(), var="Status", type="bar"):
 # test #################################################################################################################
 
 if __name__=="__main__":
-    gdf = gpd.read_file("/Users/yuehan/Desktop/Duke/20Fall/BIOSTA823/final_project/dash/cleaned_data_for_map_with_geo.tsv"
-             ,GEOM_POSSIBLE_NAMES="geometry",KEEP_GEOM_COLUMNS="NO")
-    gdf["count"] = gdf["count"].replace({"":0})
-    gdf = gdf.astype({"count":"float"})
     get_country_plot(pd.read_csv("cleaned_data_for_map.tsv", sep="\t"),
-                     gdf,
                      center='europe').show()
     get_trail_duration_plot(sort_by="count",type = "bar").show()
     get_enrollment_plot(sort_by='Enrollment').show()
@@ -0,0 +1,180 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from db_schema import study_design_list, intervention_list
+from key_value_fields import parse_key_value_field
+from locations import parse_locations
+
+
+def synthetic_locations(n_rows, distinct_fraction=0.1, seed=0):
+    """A function used to generate a synthetic `Locations` column for benchmarking.
+
+    Parameters
+    ----------
+    int:
+        the number of rows.
+    float:
+        the number of distinct site numbers per row: 0.1 repeats each location string about ten times, 1 makes
+        (almost) every string distinct, as in real site lists.
+    int:
+        the random seed.
+
+    Returns
+    -------
+    series:
+        the synthetic locations, mixing US sites, foreign sites, qualified country names and missing values.
+
+    Examples
+    --------
+    >>> locations = synthetic_locations(1000)
+    """
+    rng = np.random.RandomState(seed)
+    templates = np.array(["Massachusetts General Hospital, Boston, Massachusetts, United States",
+                          "Hopital Bichat, Paris, France",
+                          "Tehran University of Medical Sciences, Tehran, Iran, Islamic Republic of",
+                          "Kinshasa School of Public Health, Kinshasa, Congo, The Democratic Republic of the",
+                          "Wuhan",
+                          np.nan], dtype=object)
+    locations = pd.Series(templates[rng.randint(len(templates), size=n_rows)])
+    # prefix a site number, each used by about 1 / distinct_fraction rows
+    sites = pd.Series(rng.permutation(n_rows) % max(int(n_rows * distinct_fraction), 1)).astype(str)
+    return ("Site " + sites + ", " + locations).where(locations.notna())
+
+
+def legacy_parse_locations(locations):
+    """The list-comprehension location parsing that `pre_processing` used before `parse_locations`."""
+    df = pd.DataFrame({"Locations": locations})
+    df.loc[:, "Location_Country"] = [str(i).split(",")[-1].strip() for i in list(df["Locations"].copy())]
+    df.loc[df["Location_Country"] == "Islamic Republic of", "Location_Country"] = "Iran"
+    df.loc[df["Location_Country"] == "The Democratic Republic of the", "Location_Country"] = "Congo"
+    df.loc[:, "Location_City_or_State"] = [str(i).split(",")[-2].strip()
+                                           if len(str(i).split(",")) > 1
+                                           else str(i)
+                                           for i in list(df["Locations"].copy())]
+    df.loc[:, "Location_Institution"] = [str(i).split(",")[0].strip()
+                                         for i in list(df["Locations"].copy())]
+    return df.drop(columns="Locations")
+
+
+def time_rows_per_sec(func, data, repeat=3):
+    """A function used to time `func(data)` and return the best throughput in rows/sec over `repeat` runs."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(data)
+        best = min(best, time.perf_counter() - start)
+    return len(data) / best
+
+
+def benchmark_parse_locations(n_rows=1000000):
+    """A function used to benchmark the location parser against the legacy parsing on `n_rows` synthetic rows.
+
+    The factorization only pays off when location strings repeat, so both a repetitive sample (one distinct
+    string per ten rows) and a high-cardinality one (every string distinct) are timed.
+
+    Returns
+    -------
+    dictionary:
+        the throughput in rows/sec of each implementation on each sample.
+
+    Examples
+    --------
+    >>> benchmark_parse_locations(1000000)
+    """
+    results = {}
+    for sample, distinct_fraction in [("10% distinct", 0.1), ("all distinct", 1)]:
+        locations = synthetic_locations(n_rows, distinct_fraction)
+        pd.testing.assert_frame_equal(parse_locations(locations), legacy_parse_locations(locations))
+        results[f"parse_locations ({sample})"] = time_rows_per_sec(parse_locations, locations)
+        results[f"legacy ({sample})"] = time_rows_per_sec(legacy_parse_locations, locations)
+    return results
+
+
+def synthetic_key_value_field(n_rows, seed=0):
+    """A function used to generate synthetic 'Study Designs' and 'Interventions' columns for benchmarking.
+
+    Parameters
+    ----------
+    int:
+        the number of rows.
+    int:
+        the random seed.
+
+    Returns
+    -------
+    dataframe:
+        the synthetic 'Study Designs' and 'Interventions' columns, with about one distinct intervention
+        string per ten rows and missing values.
+
+    Examples
+    --------
+    >>> fields = synthetic_key_value_field(1000)
+    """
+    rng = np.random.RandomState(seed)
+    designs = np.array(["ALLOCATION: RANDOMIZED|INTERVENTION MODEL: PARALLEL ASSIGNMENT|MASKING: DOUBLE (PARTICIPANT, INVESTIGATOR)|PRIMARY PURPOSE: TREATMENT",
+                        "ALLOCATION: N/A|INTERVENTION MODEL: SINGLE GROUP ASSIGNMENT|MASKING: NONE (OPEN LABEL)|PRIMARY PURPOSE: PREVENTION",
+                        "OBSERVATIONAL MODEL: COHORT|TIME PERSPECTIVE: PROSPECTIVE",
+                        np.nan], dtype=object)
+    interventions = np.array(["DRUG: HYDROXYCHLOROQUINE|OTHER: PLACEBO",
+                              "BIOLOGICAL: CONVALESCENT PLASMA",
+                              "DEVICE: VENTILATOR|PROCEDURE: PRONE POSITIONING|DRUG: REMDESIVIR",
+                              np.nan], dtype=object)
+    intervention_ids = pd.Series(rng.randint(max(n_rows // 10, 1), size=n_rows)).astype(str)
+    interventions = pd.Series(interventions[rng.randint(len(interventions), size=n_rows)])
+    return pd.DataFrame({"Study Designs": designs[rng.randint(len(designs), size=n_rows)],
+                         "Interventions": (interventions + " " + intervention_ids).where(interventions.notna())})
+
+
+def legacy_parse_key_value_field(values, keys):
+    """The per-row parsing that `process_study_design` / `process_intervention` used before `parse_key_value_field`."""
+    def parse(row):
+        dic = {}
+        for i in range(len(keys)):
+            dic[keys[i]] = 'nan'
+        try:
+            row = row.split("|")
+            for item in row:
+                item = item.split(":")
+                key = item[0].strip()
+                value = item[1].strip()
+                if key in dic:
+                    dic[key] = value
+            return dic
+        except:
+            return dic
+    parsed = pd.json_normalize(values.apply(parse))
+    parsed.index = values.index
+    return parsed.replace("nan", np.nan)
+
+
+def benchmark_parse_key_value_field(n_rows=1000000):
+    """A function used to benchmark the 'KEY: value' field parser against the legacy parsing on `n_rows` synthetic rows.
+
+    Returns
+    -------
+    dictionary:
+        the throughput in rows/sec of each implementation, for both fields.
+
+    Examples
+    --------
+    >>> benchmark_parse_key_value_field(1000000)
+    """
+    fields = synthetic_key_value_field(n_rows)
+    results = {}
+    for column, keys in [("Study Designs", study_design_list), ("Interventions", intervention_list)]:
+        pd.testing.assert_frame_equal(parse_key_value_field(fields[column], keys),
+                                      legacy_parse_key_value_field(fields[column], keys), check_dtype=False)
+        results[f"{column} parse_key_value_field"] = time_rows_per_sec(lambda s: parse_key_value_field(s, keys), fields[column])
+        results[f"{column} legacy"] = time_rows_per_sec(lambda s: legacy_parse_key_value_field(s, keys), fields[column])
+    return results
+
+
+# run benchmarks ######################################################################################################
+
+if __name__ == "__main__":
+    for name, rows_per_sec in benchmark_parse_locations().items():
+        print(f"locations {name}: {rows_per_sec:,.0f} rows/sec")
+    for name, rows_per_sec in benchmark_parse_key_value_field().items():
+        print(f"{name}: {rows_per_sec:,.0f} rows/sec")
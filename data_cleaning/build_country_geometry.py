@@ -0,0 +1,69 @@
+import argparse
+
+import geopandas as gpd
+import pandas as pd
+
+from write_columnar import write_columnar
+
+# simplification tolerance (in degrees) of each geometry level, from the most to the least detailed
+tolerances = {"fine": 0.01,
+              "medium": 0.05,
+              "coarse": 0.2}
+
+
+def read_countries(shapefile='50m_cultural/ne_50m_admin_0_countries.shp'):
+    """A function used to read the country outlines, as used by the world map.
+
+    Parameters
+    ----------
+    str:
+        the Natural Earth admin 0 countries shapefile.
+
+    Returns
+    -------
+    GeoDataFrame:
+        one row per country with the upper-cased `ADMIN` name, its `iso_a3` (ADM0_A3) code and its geometry
+        (Antarctica dropped).
+    """
+    gdf = gpd.read_file(shapefile)[['ADMIN', 'ADM0_A3', 'geometry']].rename(columns={'ADM0_A3': 'iso_a3'})
+    gdf = gdf[gdf.ADMIN != 'Antarctica']  # drop Antarctica since no people lives there
+    gdf['ADMIN'] = gdf.ADMIN.str.upper()
+    return gdf.reset_index(drop=True)
+
+
+def simplify_levels(gdf, tolerances=tolerances):
+    """A function used to simplify the country outlines at every tolerance level.
+
+    Parameters
+    ----------
+    GeoDataFrame:
+        the countries, from `read_countries`.
+    dictionary:
+        the level name mapped to its simplification tolerance in degrees.
+
+    Returns
+    -------
+    dataframe:
+        the `iso_a3` and `ADMIN` columns and one `geometry_<level>` column of shapely geometries per level.
+
+    Examples
+    --------
+    >>> levels = simplify_levels(read_countries())
+    """
+    levels = pd.DataFrame({'iso_a3': gdf['iso_a3'], 'ADMIN': gdf['ADMIN']})
+    for level, tolerance in tolerances.items():
+        levels['geometry_' + level] = list(gdf.geometry.simplify(tolerance, preserve_topology=True))
+    return levels
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write the simplified country outlines used by the world map.")
+    parser.add_argument("--shapefile", default='50m_cultural/ne_50m_admin_0_countries.shp')
+    parser.add_argument("--output", default="country_geometry.feather")
+    args = parser.parse_args()
+
+    levels = simplify_levels(read_countries(args.shapefile))
+    # every level as WKB in one file; the dashboard builds a GeoJSON collection per level once and reuses it
+    for level in tolerances:
+        levels['geometry_' + level] = [g.wkb if g is not None else None for g in levels['geometry_' + level]]
+    write_columnar(levels, args.output)
@@ -1,6 +1,16 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
 import pandas as pd 
 import numpy as np
-import sqlite3
+
+from db_schema import study_design_list, intervention_list, connect, load_tables, bulk_insert, load_order, schema
+from countries import add_country_columns, read_country_dimension, country_columns
+from dtypes import upper_case_columns
+from key_value_fields import parse_key_value_field
+from locations import parse_locations
+
 pd.set_option('display.max_columns', None)
 pd.set_option('display.max_rows', None)
 
@@ -26,11 +36,83 @@ columns_of_interest = ['NCT Number',
                        'Last Update Posted',
                        'URL']
 
+table_names = ['study_designs',
+               'interventions',
+               'trial_info',
+               'outcome_measures',
+               'sponsor_collaborators',
+               'funded_bys',
+               'study_type',
+               'trial_sites']
+
+# '|'-separated columns that are exploded into one row per value
+multi_valued_columns = {'outcome_measures': 'Outcome Measures',
+                        'sponsor_collaborators': 'Sponsor/Collaborators',
+                        'funded_bys': 'Funded Bys',
+                        'study_type': 'Study Type'}
+
 date_columns = ['Start Date',                       
                 'Completion Date',
                 'First Posted',
                 'Last Update Posted' ]
 
+def transform_trials(covid_trials_df):
+    """A function used to apply the date, location and upper-casing transforms to a dataframe of raw trials.
+
+    Parameters
+    ----------
+    dataframe:
+        the raw covid trial data (or a chunk of it), restricted to `columns_of_interest`.
+    
+    Returns
+    -------
+    dataframe:
+        return the transformed covid trial data.
+    
+    Examples
+    --------
+    >>> df = transform_trials(raw_df)
+    """
+
+    # Only keep month and year
+    for d in date_columns:
+        covid_trials_df[d] = [(str(i).split(" ")[0] + " " + str(i).split(" ")[-1]) for i in list(covid_trials_df[d])]
+    
+    # Add the country, city/state and institution columns
+    covid_trials_df = covid_trials_df.join(parse_locations(covid_trials_df["Locations"]))
+    # canonical country name and ISO key, from the country dimension
+    covid_trials_df = add_country_columns(covid_trials_df)
+
+    covid_trials_df = upper_case_columns(covid_trials_df)
+    covid_trials_df = covid_trials_df.replace("nan", np.nan)
+    covid_trials_df = covid_trials_df.replace("NaN", np.nan)
+
+    return covid_trials_df
+
+def read_trials(filename, chunksize=None):
+    """A function used to read the SearchResults TSV, keeping only `columns_of_interest` at read time.
+
+    Parameters
+    ----------
+    str:
+        the filename of dataset.
+    int:
+        the number of rows per chunk; if None the whole file is read at once.
+    
+    Returns
+    -------
+    dataframe or iterator of dataframes:
+        the raw covid trial data, or an iterator over chunks of it when `chunksize` is given.
+    
+    Examples
+    --------
+    >>> for chunk in read_trials("SearchResults_new.tsv", chunksize=50000): ...
+    """
+    reader = pd.read_csv(filename, sep="\t", usecols=columns_of_interest, chunksize=chunksize)
+    if chunksize is None:
+        return reader[columns_of_interest]
+    return (chunk[columns_of_interest] for chunk in reader)
+
 def pre_processing(filename):
     """A function used to get the data and pre-process the data to the big data frame.
 
@@ -49,37 +131,116 @@ def pre_processing(filename):
     >>> df = pre_processing()
     """
     
-    covid_trials_df = pd.read_csv(filename, sep="\t")
+    return transform_trials(read_trials(filename))
 
-    # select the columns
-    covid_trials_df = covid_trials_df[columns_of_interest]
+def iter_pre_processing(filename, chunksize=50000):
+    """A function used to pre-process the data chunk by chunk, so that only one chunk is held in memory at a time.
 
-    # Only keep month and year
-    for d in date_columns:
-        covid_trials_df[d] = [(str(i).split(" ")[0] + " " + str(i).split(" ")[-1]) for i in list(covid_trials_df[d])]
+    Parameters
+    ----------
+    str:
+        the filename of dataset.
+    int:
+        the number of rows per chunk.
+    
+    Returns
+    -------
+    generator:
+        yields the pre-processed dataframe of each chunk.
     
-    # Add a countries column
-    covid_trials_df.loc[:,"Location_Country"] = [str(i).split(",")[-1].strip() for i in list(covid_trials_df["Locations"].copy())]
-    # fix Incorrectly named country columns 
-    covid_trials_df["Location_Country"].loc[covid_trials_df["Location_Country"] == "Islamic Republic of"] = "Iran"
-    covid_trials_df["Location_Country"].loc[covid_trials_df["Location_Country"] == "The Democratic Republic of the"] = "Congo"
+    Examples
+    --------
+    >>> for df in iter_pre_processing("SearchResults_new.tsv"): ...
+    """
 
+    for chunk in read_trials(filename, chunksize=chunksize):
+        yield transform_trials(chunk)
 
-    # Add a countries column
-    covid_trials_df.loc[:,"Location_City_or_State"] = [str(i).split(",")[-2].strip() 
-                                                    if len(str(i).split(",")) > 1 
-                                                    else str(i)
-                                                    for i in list(covid_trials_df["Locations"].copy())]
+def stream_pre_processing(filename, output_filename, chunksize=50000):
+    """A function used to pre-process a large dataset in streaming mode, writing each chunk out before reading the next.
 
+    Parameters
+    ----------
+    str:
+        the filename of dataset.
+    str:
+        the filename of the pre-processed TSV to write.
+    int:
+        the number of rows per chunk.
+    
+    Returns
+    -------
+    int:
+        the number of rows written.
+    
+    Examples
+    --------
+    >>> n_rows = stream_pre_processing("SearchResults_new.tsv", "cleaned_covid_studies.tsv")
+    """
 
-    covid_trials_df.loc[:,"Location_Institution"] = [str(i).split(",")[0].strip()  
-                                                    for i in list(covid_trials_df["Locations"].copy())]
+    n_rows = 0
+    for i, chunk in enumerate(iter_pre_processing(filename, chunksize=chunksize)):
+        chunk.to_csv(output_filename, sep="\t", index=False, mode="w" if i == 0 else "a", header=(i == 0))
+        n_rows += chunk.shape[0]
+    return n_rows
 
-    covid_trials_df = covid_trials_df.applymap(lambda s:s.upper() if type(s) == str else s)
-    covid_trials_df = covid_trials_df.replace("nan", np.nan)
-    covid_trials_df = covid_trials_df.replace("NaN", np.nan)
+def select_tables(covid_trials_df):
+    """A function used to select the columns of each small dataframe from the big covid trail dataframe, before any transform.
 
-    return covid_trials_df
+    Parameters
+    ----------
+    dataframe:
+        the big dataframe.
+    
+    Returns
+    -------
+    dictionary:
+        the table name mapped to its untransformed dataframe, in `table_names` order.
+
+    Examples
+    --------
+    >>> raw_tables = select_tables(df)
+    """
+
+    trial_into_list = ['NCT Number', 'Title', 'Locations', 'Status', 'Study Results', 'Conditions',
+                   'Gender', 'Age', 'Phases','Enrollment', 'URL', 'Location_Country', 'Location_Country_ISO',
+                   'Location_City_or_State', 'Location_Institution', 'Start Date', 'Completion Date', 'First Posted','Last Update Posted',
+                   'Funded Bys', 'Study Type']
+
+    return {'study_designs': covid_trials_df[['NCT Number', 'Study Designs']].drop_duplicates(), # pk: NCT number
+            'interventions': covid_trials_df[['NCT Number', 'Interventions']].drop_duplicates(), # pk: NCT number
+            'trial_info': covid_trials_df[trial_into_list].drop_duplicates(),
+            'outcome_measures': covid_trials_df[['NCT Number', 'Outcome Measures']].drop_duplicates(), # pk: index
+            'sponsor_collaborators': covid_trials_df[['NCT Number', 'Sponsor/Collaborators']].drop_duplicates(), # pk: index
+            'funded_bys': covid_trials_df[['NCT Number', 'Funded Bys']].drop_duplicates(), # pk: index
+            'study_type': covid_trials_df[['NCT Number', 'Study Type']].drop_duplicates(), # pk: index
+            'trial_sites': covid_trials_df[['NCT Number', 'Locations']].dropna().drop_duplicates()} # pk: index
+
+def explode_multi_valued(df, column):
+    """A function used to explode a '|'-separated column into one row per value, with an 'index' pk column.
+
+    Parameters
+    ----------
+    dataframe:
+        the dataframe including 'NCT Number' and `column` fields.
+    str:
+        the name of the '|'-separated column.
+    
+    Returns
+    -------
+    dataframe: 
+        the exploded dataframe, including 'NCT Number', `column` and 'index' fields.
+
+    Examples
+    --------
+    >>> funded_bys = explode_multi_valued(funded_bys, 'Funded Bys')
+    """
+
+    df = df.assign(**{column:df[column].str.split('|')})
+    df = df.explode(column)
+    df.reset_index(drop=True, inplace=True)
+    df['index'] = df.index
+    return df
 
 def split_df(covid_trials_df):
     """A function used to split the big covid trail dataframe into several small dataframes in order to follow 3NF.
@@ -111,42 +272,16 @@ def split_df(covid_trials_df):
     >>> study_designs, interventions, outcome_measures, sponsor_collaborators, funded_bys, study_type, trial_info = split_df(df)
     """
 
-    study_designs = covid_trials_df[['NCT Number', 'Study Designs']].drop_duplicates() # pk: NCT number
-    interventions = covid_trials_df[['NCT Number', 'Interventions']].drop_duplicates() # pk: NCT number
-    outcome_measures = covid_trials_df[['NCT Number', 'Outcome Measures']].drop_duplicates() # pk: index
-    sponsor_collaborators = covid_trials_df[['NCT Number', 'Sponsor/Collaborators']].drop_duplicates() # pk: index
-    funded_bys = covid_trials_df[['NCT Number', 'Funded Bys']].drop_duplicates() # pk: index
-    study_type = covid_trials_df[['NCT Number', 'Study Type']].drop_duplicates() # pk: index
+    tables = select_tables(covid_trials_df)
+    for name, column in multi_valued_columns.items():
+        tables[name] = explode_multi_valued(tables[name], column)
 
-    trial_into_list = ['NCT Number', 'Title', 'Locations', 'Status', 'Study Results', 'Conditions',
-                   'Gender', 'Age', 'Phases','Enrollment', 'URL', 'Location_Country', 'Location_City_or_State',
-                   'Location_Institution', 'Start Date', 'Completion Date', 'First Posted','Last Update Posted',
-                   'Funded Bys', 'Study Type']
-    trial_info = covid_trials_df[trial_into_list].drop_duplicates()
-
-    outcome_measures = outcome_measures.assign(**{'Outcome Measures':outcome_measures['Outcome Measures'].str.split('|')})
-    outcome_measures = outcome_measures.explode('Outcome Measures')
-    sponsor_collaborators = sponsor_collaborators.assign(**{'Sponsor/Collaborators':sponsor_collaborators['Sponsor/Collaborators'].str.split('|')})
-    sponsor_collaborators = sponsor_collaborators.explode('Sponsor/Collaborators')
-    funded_bys = funded_bys.assign(**{'Funded Bys':funded_bys['Funded Bys'].str.split('|')})
-    funded_bys = funded_bys.explode('Funded Bys')
-    study_type = study_type.assign(**{'Study Type':study_type['Study Type'].str.split('|')})
-    study_type = study_type.explode('Study Type')
-
-    outcome_measures.reset_index(drop=True, inplace=True)
-    outcome_measures['index'] = outcome_measures.index
-    sponsor_collaborators.reset_index(drop=True, inplace=True)
-    sponsor_collaborators['index'] = sponsor_collaborators.index
-    funded_bys.reset_index(drop=True, inplace=True)
-    funded_bys['index'] = funded_bys.index
-    study_type.reset_index(drop=True, inplace=True)
-    study_type['index'] = study_type.index
-
-    return study_designs, interventions, outcome_measures, sponsor_collaborators, funded_bys, study_type, trial_info
+    return (tables['study_designs'], tables['interventions'], tables['outcome_measures'], tables['sponsor_collaborators'],
+            tables['funded_bys'], tables['study_type'], tables['trial_info'])
 
 
 def process_study_design(study_designs):
-    """A function used to process the study design dataframe, by expanding JSON data and transferring to short form.
+    """A function used to process the study design dataframe, by parsing its 'KEY: value' items into one column per key.
 
     Parameters
     ----------
@@ -164,46 +299,7 @@ def process_study_design(study_designs):
     >>> study_designs_new = process_study_design(study_designs)
     """
 
-    study_design_list = ["ALLOCATION", 
-                     "INTERVENTION MODEL", 
-                     "MASKING",
-                     "PRIMARY PURPOSE",
-                     "OBSERVATIONAL MODEL",
-                     "TIME PERSPECTIVE"] 
-    def parse_study_design(row):
-        """A function used to parse the string into JSON data inside study design cells.
-
-        Parameters
-        ----------
-        dataframe row:
-            each row of study design dataframe.
-
-        Returns
-        -------
-        dictionary: 
-            the parsed study design string data.
-
-        Examples
-        --------
-        >>> study_design_df = study_designs['Study Designs'].apply(parse_study_design)
-        """
-        
-        dic = {}
-        for i in range(len(study_design_list)):
-            dic[study_design_list[i]] = 'nan'
-        try:
-            row = row.split("|")
-            for item in row:
-                item = item.split(":")
-                key = item[0].strip()
-                value = item[1].strip()
-                if key in dic:
-                    dic[key] = value
-            return dic
-        except:
-            return dic
-    study_design_df = study_designs['Study Designs'].apply(parse_study_design)
-    study_designs.loc[:,study_design_list] = pd.json_normalize(study_design_df)
+    study_designs = study_designs.join(parse_key_value_field(study_designs['Study Designs'], study_design_list))
     study_designs.drop('Study Designs', axis=1, inplace=True) 
     study_designs = study_designs.replace("nan", np.nan)
     study_designs = study_designs.replace("N/A", np.nan)
@@ -211,7 +307,7 @@ def process_study_design(study_designs):
 
 
 def process_intervention(interventions):
-    """A function used to process the interventions dataframe, by expanding JSON data and transferring to short form.
+    """A function used to process the interventions dataframe, by parsing its 'KEY: value' items into one column per key.
 
     Parameters
     ----------
@@ -230,49 +326,42 @@ def process_intervention(interventions):
     >>> interventions_new = process_intervention(interventions)
     """
 
-    intervention_list = ['DRUG', 'PROCEDURE', 'OTHER', 'DEVICE', 'BIOLOGICAL', 'DIAGNOSTIC TEST',
-                     'DIETARY SUPPLEMENT', 'GENETIC', 'COMBINATION PRODUCT', 'BEHAVIORAL', 'RADIATION'] 
-    
-    def parse_intervention(row):
-        """A function used to parse the string into JSON data inside intervention cells.
-
-        Parameters
-        ----------
-        dataframe row:
-            each row of intervention dataframe.
-
-        Returns
-        -------
-        dictionary: 
-            the parsed intervention string data.
-
-        Examples
-        --------
-        >>> intervention_df = interventions['Interventions'].apply(parse_intervention)
-        """
-        dic = {}
-        for i in range(len(intervention_list)):
-            dic[intervention_list[i]] = 'nan'
-        try:
-            row = row.split("|")
-            for item in row:
-                item = item.split(":")
-                key = item[0].strip()
-                value = item[1].strip()
-                if key in dic:
-                    dic[key] = value
-            return dic
-        except:
-            return dic
-        
-    intervention_df = interventions['Interventions'].apply(parse_intervention)
-    interventions.loc[:,intervention_list] = pd.json_normalize(intervention_df)
+    interventions = interventions.join(parse_key_value_field(interventions['Interventions'], intervention_list))
     interventions.drop('Interventions', axis=1, inplace=True) 
     interventions = interventions.replace("nan", np.nan)
     interventions = interventions.replace("N/A", np.nan)
     return interventions
 
 
+def process_trial_sites(trial_sites):
+    """A function used to build the site table, with one row per trial and site of its '|'-separated `Locations`.
+
+    Every site is parsed like the trial-level location (country, city/state and institution, plus the canonical
+    country name and ISO code), so multi-site trials keep all of their sites instead of only the last one.
+
+    Parameters
+    ----------
+    dataframe:
+        the trial sites dataframe, including 'NCT Number' and 'Locations' fields.
+    
+    Returns
+    -------
+    dataframe: 
+        the site dataframe, including 'NCT Number', 'Location', 'Location_Country', 'Location_City_or_State',
+        'Location_Institution', 'Location_Country_ISO' and 'index' fields.
+
+    Examples
+    --------
+    >>> trial_sites = process_trial_sites(trial_sites)
+    """
+
+    trial_sites = explode_multi_valued(trial_sites, 'Locations')
+    trial_sites['Locations'] = trial_sites['Locations'].str.strip()
+    trial_sites = trial_sites.join(parse_locations(trial_sites['Locations']))
+    trial_sites = add_country_columns(trial_sites)
+    return trial_sites.rename(columns={'Locations': 'Location'})
+
+
 def checkPK(df, pk):
     if np.any(df[pk].isnull()):
         print('NULL values.')
@@ -281,41 +370,300 @@ def checkPK(df, pk):
     else:
         print('Valid PK.')
 
-def clean_and_set_up_db(df_path):
-    covid_trials_df = pre_processing(df_path)
-    study_designs, interventions, outcome_measures, sponsor_collaborators, funded_bys, study_type, trial_info = split_df(covid_trials_df)
-    study_designs_new = process_study_design(study_designs)
-    interventions_new = process_intervention(interventions)
+def transform_tables(raw_tables, n_workers=1):
+    """A function used to run the independent per-table transforms, optionally in parallel on a process pool.
+
+    `process_study_design`, `process_intervention`, `process_trial_sites` and the four explodes don't depend on
+    each other. With
+    `n_workers` > 1 every table is also cut into `n_workers` row blocks, so that all (table, block) pairs
+    are spread over the pool; the blocks are concatenated back in order and the 'index' pk is renumbered.
+
+    Parameters
+    ----------
+    dictionary:
+        the table name mapped to its untransformed dataframe, from `select_tables`.
+    int:
+        the number of worker processes; 1 runs the transforms one after another in this process.
+    
+    Returns
+    -------
+    dictionary:
+        the table name mapped to its transformed dataframe, in `table_names` order.
+
+    Examples
+    --------
+    >>> tables = transform_tables(select_tables(df), n_workers=16)
+    """
 
-    conn = sqlite3.connect('covid_trials.db')
-    study_designs.to_sql('study_designs', conn, if_exists='replace', index=False)
-    interventions.to_sql('interventions', conn, if_exists='replace', index=False)
-    trial_info.to_sql('trial_info', conn, if_exists='replace', index=False)
-    outcome_measures.to_sql('outcome_measures', conn, if_exists='replace', index=False)
-    sponsor_collaborators.to_sql('sponsor_collaborators', conn, if_exists='replace', index=False)
-    funded_bys.to_sql('funded_bys', conn, if_exists='replace', index=False)
-    study_type.to_sql('study_type', conn, if_exists='replace', index=False)
+    transforms = {'study_designs': process_study_design,
+                  'interventions': process_intervention,
+                  'trial_sites': process_trial_sites}
+    for name, column in multi_valued_columns.items():
+        transforms[name] = partial(explode_multi_valued, column=column)
+
+    if n_workers > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = {name: [executor.submit(transform, block.reset_index(drop=True))
+                              for block in np.array_split(raw_tables[name], n_workers) if block.shape[0] > 0]
+                       for name, transform in transforms.items()}
+            transformed = {}
+            for name, name_futures in futures.items():
+                table = pd.concat([future.result() for future in name_futures], ignore_index=True)
+                if 'index' in table.columns:
+                    table['index'] = table.index
+                transformed[name] = table
+    else:
+        transformed = {name: transform(raw_tables[name]) for name, transform in transforms.items()}
 
+    return {name: transformed.get(name, raw_tables[name]) for name in table_names}
 
-if __name__ == "__main__":
-    # TODO: consider changing this to call method above
-    covid_trials_df = pre_processing("SearchResults_new.tsv")
-    study_designs, interventions, outcome_measures, sponsor_collaborators, funded_bys, study_type, trial_info = split_df(covid_trials_df)
-    study_designs_new = process_study_design(study_designs)
-    interventions_new = process_intervention(interventions)
+def build_tables(covid_trials_df, n_workers=1):
+    """A function used to build the eight normalized tables from the pre-processed covid trial dataframe.
+
+    Parameters
+    ----------
+    dataframe:
+        the pre-processed covid trial dataframe.
+    int:
+        the number of worker processes for the per-table transforms.
+    
+    Returns
+    -------
+    dictionary:
+        the table name mapped to its dataframe, in `table_names` order.
+
+    Examples
+    --------
+    >>> tables = build_tables(pre_processing("SearchResults_new.tsv"))
+    """
+
+    return transform_tables(select_tables(covid_trials_df), n_workers=n_workers)
+
+def get_trial_versions(covid_trials_df):
+    """A function used to fingerprint each trial by its 'Last Update Posted' and a hash of its row.
+
+    The row hash catches updates made within the same month, since 'Last Update Posted' only keeps month and year.
+
+    Parameters
+    ----------
+    dataframe:
+        the pre-processed covid trial dataframe.
+    
+    Returns
+    -------
+    dataframe: 
+        the trial versions dataframe, including 'NCT Number', 'Last Update Posted' and 'Row Hash' fields.
+
+    Examples
+    --------
+    >>> trial_versions = get_trial_versions(covid_trials_df)
+    """
+
+    row_hash = pd.util.hash_pandas_object(covid_trials_df[columns_of_interest], index=False)
+    trial_versions = covid_trials_df[['NCT Number', 'Last Update Posted']].assign(**{'Row Hash': row_hash.values.view('int64')})
+    return trial_versions.drop_duplicates('NCT Number', keep='last')
+
+def iter_tables(covid_trials_chunks, n_workers=1, cleaned_output=None):
+    """A function used to build the tables of each chunk of pre-processed trials, for `load_tables`.
+
+    Parameters
+    ----------
+    iterable:
+        the pre-processed covid trial dataframes, e.g. from `iter_pre_processing`.
+    int:
+        the number of worker processes for the per-table transforms.
+    str:
+        optional filename of a TSV the pre-processed trials are also written to, chunk by chunk.
+
+    Returns
+    -------
+    generator:
+        yields the country dimension first, then the tables (trial_versions included) of each chunk.
+
+    Examples
+    --------
+    >>> load_tables(conn, iter_tables(iter_pre_processing("SearchResults_new.tsv")))
+    """
+
+    yield {'countries': read_country_dimension()[country_columns]}
+    for i, covid_trials_df in enumerate(covid_trials_chunks):
+        if cleaned_output is not None:
+            covid_trials_df.to_csv(cleaned_output, sep="\t", index=False, mode="w" if i == 0 else "a", header=(i == 0))
+        tables = build_tables(covid_trials_df, n_workers=n_workers)
+        tables['trial_versions'] = get_trial_versions(covid_trials_df)
+        yield tables
+
+def clean_and_set_up_db(df_path, db_path='covid_trials.db', n_workers=1, chunksize=None, cleaned_output=None):
+    """A function used to clean the data and (re)build every table of the database from scratch.
+
+    With `chunksize`, the export is read, pre-processed and loaded one chunk at a time (in a single transaction),
+    so memory use is bounded by the chunk size rather than by the size of the export.
+
+    Parameters
+    ----------
+    str:
+        the filename of dataset.
+    str:
+        the filename of the SQLite database.
+    int:
+        the number of worker processes for the per-table transforms.
+    int:
+        the number of rows per chunk; if None the whole file is processed at once.
+    str:
+        optional filename of a TSV the pre-processed trials are also written to.
+
+    Examples
+    --------
+    >>> clean_and_set_up_db("SearchResults_new.tsv", chunksize=50000)
+    """
+
+    if chunksize is None:
+        covid_trials_chunks = [pre_processing(df_path)]
+    else:
+        covid_trials_chunks = iter_pre_processing(df_path, chunksize=chunksize)
+
+    conn = connect(db_path)
+    load_tables(conn, iter_tables(covid_trials_chunks, n_workers=n_workers, cleaned_output=cleaned_output))
+    conn.close()
+
+def compare_trial_versions(incoming, stored):
+    """A function used to compare incoming trial versions against the stored ones.
+
+    Parameters
+    ----------
+    dataframe:
+        the incoming trial versions, from `get_trial_versions`.
+    dataframe:
+        the stored trial versions; the 'Row Hash' field is optional.
     
-    conn = sqlite3.connect('covid_trials.db')
-    study_designs.to_sql('study_designs', conn, if_exists='replace', index=False)
-    interventions.to_sql('interventions', conn, if_exists='replace', index=False)
-    trial_info.to_sql('trial_info', conn, if_exists='replace', index=False)
-    outcome_measures.to_sql('outcome_measures', conn, if_exists='replace', index=False)
-    sponsor_collaborators.to_sql('sponsor_collaborators', conn, if_exists='replace', index=False)
-    funded_bys.to_sql('funded_bys', conn, if_exists='replace', index=False)
-    study_type.to_sql('study_type', conn, if_exists='replace', index=False)
+    Returns
+    -------
+    new:
+        the NCT Numbers that are not stored yet.
+    changed:
+        the NCT Numbers whose 'Last Update Posted' (or row hash, when stored) differs.
+    withdrawn:
+        the NCT Numbers that are stored but no longer in the incoming data.
 
+    Examples
+    --------
+    >>> new, changed, withdrawn = compare_trial_versions(get_trial_versions(df), stored_versions)
+    """
 
+    merged = incoming.merge(stored, on='NCT Number', how='outer', suffixes=('', '_stored'), indicator=True)
+    both = merged[merged['_merge'] == 'both']
+    update_differs = both['Last Update Posted'].fillna('') != both['Last Update Posted_stored'].fillna('')
+    if 'Row Hash_stored' in both.columns:
+        update_differs |= both['Row Hash'] != both['Row Hash_stored']
 
+    new = merged.loc[merged['_merge'] == 'left_only', 'NCT Number']
+    changed = both.loc[update_differs, 'NCT Number']
+    withdrawn = merged.loc[merged['_merge'] == 'right_only', 'NCT Number']
+    return new.tolist(), changed.tolist(), withdrawn.tolist()
 
+def update_db(df_path, db_path='covid_trials.db', n_workers=1, cleaned_output=None):
+    """A function used to incrementally update the database, only rewriting new or changed trials and deleting withdrawn ones.
 
+    Trials are matched on 'NCT Number' and compared on 'Last Update Posted' (plus the row hash kept in
+    `trial_versions`); all rows of an affected trial are deleted from the eight tables and the fresh rows
+    are bulk-inserted in one transaction. Falls back to `clean_and_set_up_db` when the database has no tables yet,
+    in which case every trial is counted as new.
 
+    Parameters
+    ----------
+    str:
+        the filename of dataset.
+    str:
+        the filename of the SQLite database.
+    int:
+        the number of worker processes for the per-table transforms.
+    str:
+        optional filename of a TSV the pre-processed trials are also written to.
+    
+    Returns
+    -------
+    dictionary:
+        the number of new, changed and withdrawn trials.
+
+    Examples
+    --------
+    >>> update_db("SearchResults_new.tsv")
+    {'new': 12, 'changed': 40, 'withdrawn': 1}
+    """
+
+    conn = connect(db_path)
+    existing_tables = set(pd.read_sql("select name from sqlite_master where type = 'table'", conn)['name'])
+    # databases built before the country dimension lack its table and key column, so they are rebuilt
+    if not set(table_names + ['countries']) <= existing_tables:
+        conn.close()
+        clean_and_set_up_db(df_path, db_path, n_workers, cleaned_output=cleaned_output)
+        conn = connect(db_path)
+        n_trials = conn.execute('select count(*) from trial_info').fetchone()[0]
+        conn.close()
+        return {'new': n_trials, 'changed': 0, 'withdrawn': 0}
 
+    covid_trials_df = pre_processing(df_path)
+    if cleaned_output is not None:
+        covid_trials_df.to_csv(cleaned_output, sep="\t", index=False)
+    incoming_versions = get_trial_versions(covid_trials_df)
+    if 'trial_versions' in existing_tables:
+        stored_versions = pd.read_sql('select * from trial_versions', conn)
+    else:
+        stored_versions = pd.read_sql('select distinct "NCT Number", "Last Update Posted" from trial_info', conn)
+    new, changed, withdrawn = compare_trial_versions(incoming_versions, stored_versions)
+
+    to_delete = [(nct,) for nct in changed + withdrawn]
+    to_write = covid_trials_df[covid_trials_df['NCT Number'].isin(new + changed)].reset_index(drop=True)
+
+    # the deletes, the inserts and a missing trial_versions table are written in one explicit transaction, so a
+    # failed update leaves the database as it was
+    conn.execute('BEGIN')
+    try:
+        for name in table_names + ['trial_versions']:
+            if name in existing_tables:
+                conn.executemany(f'delete from {name} where "NCT Number" = ?', to_delete)
+        if 'trial_versions' not in existing_tables:
+            # databases built before trial_versions get it from the schema, with the version of every unchanged
+            # trial; the new and changed ones are inserted below, after their trial_info rows
+            conn.execute(schema['trial_versions'])
+            bulk_insert(conn, 'trial_versions', incoming_versions[~incoming_versions['NCT Number'].isin(new + changed)])
+
+        if to_write.shape[0] > 0:
+            tables = build_tables(to_write, n_workers=n_workers)
+            tables['trial_versions'] = incoming_versions[incoming_versions['NCT Number'].isin(new + changed)]
+            for name in load_order:
+                if name not in tables:
+                    continue  # the country dimension is only loaded by a full rebuild
+                table = tables[name]
+                if 'index' in table.columns:
+                    # keep the 'index' pk unique by continuing after the largest stored value
+                    start = conn.execute(f'select coalesce(max("index") + 1, 0) from {name}').fetchone()[0]
+                    table['index'] = table['index'] + start
+                bulk_insert(conn, name, table)
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+    conn.close()
+
+    return {'new': len(new), 'changed': len(changed), 'withdrawn': len(withdrawn)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clean the ClinicalTrials.gov SearchResults TSV and load it into SQLite.")
+    parser.add_argument("filename", nargs="?", default="SearchResults_new.tsv")
+    parser.add_argument("--db", default="covid_trials.db")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only rewrite new or changed trials and delete withdrawn ones")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes for the per-table transforms")
+    parser.add_argument("--cleaned-output", default=None,
+                        help="also write the pre-processed trials to this TSV (e.g. data/cleaned_covid_studies_092020.tsv)")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="rebuild the database from chunks of this many rows, to bound memory use")
+    args = parser.parse_args()
+
+    if args.incremental:
+        print(update_db(args.filename, args.db, args.workers, args.cleaned_output))
+    else:
+        clean_and_set_up_db(args.filename, args.db, args.workers, args.chunksize, args.cleaned_output)
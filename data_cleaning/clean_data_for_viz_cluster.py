@@ -1,4 +1,3 @@
-from datetime import datetime
 import json
 import re
 import sqlite3
@@ -7,6 +6,12 @@ import numpy as np
 import pandas as pd
 import geopandas as gpd
 
+from write_columnar import write_columnar
+from db_schema import study_design_list, intervention_list
+from dtypes import optimize_dtypes, memory_report
+from trial_dates import date_columns, parse_month_year, add_trial_duration, add_categories
+from trial_cube import build_trial_cube
+
 
 # get data functions ###################################################################################################
 
@@ -24,95 +29,16 @@ def get_df():
     df['Age'] = df.Age.str.extract(r'[(](.*?)[)]')
 
     ## date
-    date_columns = ['Start Date',
-                    'Completion Date',
-                    'First Posted',
-                    'Last Update Posted']
-
-    def rep_m(m):
-        months = ["January", "February", "March", "April", "May", "June", "July",
-                  "August", "September", "October", "November", "December"]
-        months = [x.upper() for x in months]
-        for i in months:
-            if m == i:
-                m = months.index(i) + 1
-        return str(m)
-
-    def to_date(date_str):
-        if date_str == "NAN NAN":
-            return np.nan
-        else:
-            date_str = date_str.split()
-            Y = date_str[1]
-            m = rep_m(date_str[0])
-
-            date = datetime.strptime(Y + "-" + m, "%Y-%m")
-
-            return date
-
-    df[date_columns] = df[date_columns].applymap(to_date)
+    df[date_columns] = parse_month_year(df, date_columns)
 
     ## trial duration
-    def get_interval_day(arrLike, start, end):
-        start_date = arrLike[start]
-        end_date = arrLike[end]
-
-        return (end_date - start_date).days
-
-    def month_delta(start_date, end_date):
-        flag = True
-        if start_date > end_date:
-            start_date, end_date = end_date, start_date
-            flag = False
-        year_diff = end_date.year - start_date.year
-        end_month = year_diff * 12 + end_date.month
-        delta = end_month - start_date.month
-        return -delta if flag is False else delta
-
-    def get_interval_month(arrLike, start, end):
-        start_date = arrLike[start]
-        end_date = arrLike[end]
-
-        return month_delta(start_date, end_date)
-
-    df['Trial_Duration_Days'] = df.apply(
-        get_interval_day, axis=1, args=('Start Date', 'Completion Date'))
-
-    df['Trial_Duration_Months'] = df.apply(
-        get_interval_month, axis=1, args=('Start Date', 'Completion Date'))
+    df = add_trial_duration(df, 'Start Date', 'Completion Date')
     
     ## categorize numeric variables
-    df["Trial_Duration_Category"] = pd.cut(df.Trial_Duration_Months,
-                                        [-float('inf'),0,3,6,12,24,60,120,float('inf')],
-                                        labels=['less then 1 month','1 - 3 months','4 - 6 months','7 - 12 months',
-                                                '1 - 2 years','2 - 5 years','5 - 10 years','over 10 years'])
-    df["Enrollment_Category"] = pd.cut(df.Enrollment,
-                                  [-float('inf'),9,50,100,200,500,1000,5000,10000,float('inf')],
-                                  labels=['less then 10','11 - 50','51 - 100','101 - 200',
-                                          '201 - 500','501 - 1000','1001 - 5000','5001 - 10000','over 10000'])
-    
-    ## clean country name
-    def rename_country(old_name):
-        name_match = {
-            'UNITED STATES': 'UNITED STATES OF AMERICA',
-            'RUSSIAN FEDERATION': 'RUSSIA',
-            'HONG KONG': 'HONG KONG S.A.R.',
-            'CONGO': 'DEMOCRATIC REPUBLIC OF THE CONGO',
-            'REPUBLIC OF': 'DEMOCRATIC REPUBLIC OF THE CONGO',
-            'NORTH MACEDONIA': 'MACEDONIA',
-            'CÔTE D\'IVOIRE': 'IVORY COAST',
-            'FRENCH GUIANA': 'GUINEA',
-            'GIBRALTAR': 'SPAIN',
-            'MARTINIQUE': 'FRANCE'
-        }
-        for k, v in name_match.items():
-            if old_name == k:
-                return v
-        if not old_name in set(name_match):
-            return old_name
-
-    df['Location_Country'] = df.Location_Country.apply(rename_country)
+    df = add_categories(df)
 
+    ## country names are already canonical: clean_data.py maps them through the country dimension (countries.py)
+    
     ## clean study type variable
     df["Study Type"] = (
         df["Study Type"].
@@ -123,28 +49,31 @@ def get_df():
 
     return df
 
-def get_data_for_map(df = get_df()):
+def get_data_for_map(df = None):
+    if df is None:
+        df = get_df()
+
     # load the data of geo information
     shapefile = '50m_cultural/ne_50m_admin_0_countries.shp'
-    gdf = gpd.read_file(shapefile)[['ADMIN', 'geometry']]
+    gdf = gpd.read_file(shapefile)[['ADMIN', 'ADM0_A3', 'geometry']]
     gdf = gdf[gdf.ADMIN != 'Antarctica']  # drop Antarctica since no people lives there
     gdf['ADMIN'] = gdf.ADMIN.apply(lambda x: x.upper())
     
+    # trials are counted by country ISO code; the names are the canonical ones of the country dimension
     country_count_df = (
         df
         # add criteria here
-        [['Location_Country']]
-        [(df['Location_Country'] != 'NAN') & (df['Location_Country'] != 'REPUBLIC OF')].
-        # the last criteria can be drop when we confirm what 'REPUBLIC OF' is
+        [['Location_Country_ISO', 'Location_Country']].
+        dropna(subset=['Location_Country_ISO']).
         assign(count=1).
-        groupby(['Location_Country']).
+        groupby(['Location_Country_ISO', 'Location_Country']).
         agg('sum').
         sort_values('count', ascending=False)
     )
 
-    # equip data with geo info
+    # equip data with geo info, joined on the ISO key
     geo_country_count_df = (
-        gdf.merge(country_count_df, left_on='ADMIN', right_on='Location_Country', how='left').
+        gdf.merge(country_count_df.reset_index(), left_on='ADM0_A3', right_on='Location_Country_ISO', how='left').
         sort_values('count', ascending=False)
     )
     
@@ -157,8 +86,10 @@ def get_data_for_cluster():
     """
     # load in data
     conn = sqlite3.connect('covid_trials.db')
-    study_designs=pd.read_sql("select * from study_designs", con = conn)
-    interventions=pd.read_sql("select * from interventions", con = conn)
+    # one join on the "NCT Number" primary keys instead of two full-table reads merged in pandas
+    designs_and_interventions=pd.read_sql('select * from study_designs join interventions using ("NCT Number")', con = conn)
+    study_designs=designs_and_interventions[["NCT Number"] + study_design_list]
+    interventions=designs_and_interventions[["NCT Number"] + intervention_list].copy()
     funded_bys=pd.read_sql("select * from funded_bys", con = conn)
     conn.close()
 
@@ -196,7 +127,7 @@ def get_data_for_cluster():
     # merge
     df_= (
         df.drop(columns = ['Title','Locations','Conditions','Enrollment','URL',
-                            'Location_City_or_State','Location_Institution','Start Date',
+                            'Location_City_or_State','Location_Institution','Location_Country_ISO','Start Date',
                             'Completion Date','First Posted','Last Update Posted',
                             'Trial_Duration_Days','Trial_Duration_Months','Funded Bys']).
         set_index('NCT Number').
@@ -212,13 +143,25 @@ def get_data_for_cluster():
 # test #################################################################################################################
 
 if __name__=="__main__":
-    get_df().to_csv("cleaned_data_for_viz.tsv", sep="\t")
-    get_data_for_map()[0].to_csv("cleaned_data_for_map.tsv", sep="\t")
-    get_data_for_map()[1].to_csv("cleaned_data_for_map_with_geo.tsv", sep="\t")
-    get_data_for_cluster().to_csv("cleaned_data_for_cluster.tsv", sep="\t")
-    
-
-
-
-
-
+    df = get_df()
+    country_count_df, geo_country_count_df = get_data_for_map(df)
+    cluster_df = get_data_for_cluster()
+    cube_df = build_trial_cube(df)
+
+    df.to_csv("cleaned_data_for_viz.tsv", sep="\t")
+    country_count_df.to_csv("cleaned_data_for_map.tsv", sep="\t")
+    geo_country_count_df.to_csv("cleaned_data_for_map_with_geo.tsv", sep="\t")
+    cluster_df.to_csv("cleaned_data_for_cluster.tsv", sep="\t")
+    cube_df.to_csv("cleaned_data_for_world_cube.tsv", sep="\t", index=False)
+
+    # columnar copies with compact, preserved dtypes, for the dashboard loaders
+    tables = {"cleaned_data_for_viz": df,
+              "cleaned_data_for_map": country_count_df,
+              "cleaned_data_for_cluster": cluster_df}
+    optimized_tables = {name: optimize_dtypes(table) for name, table in tables.items()}
+    print(memory_report(tables, optimized_tables))
+    for name, table in optimized_tables.items():
+        write_columnar(table, name + ".feather")
+    write_columnar(geo_country_count_df, "cleaned_data_for_map_with_geo.feather", geometry_column="geometry")
+    # the cube is already aggregated and categorical, so it is written as it is
+    write_columnar(cube_df, "cleaned_data_for_world_cube.feather")
@@ -0,0 +1,151 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# one row per country: an integer id, the Natural Earth ADM0_A3 code (ISO 3166-1 alpha-3 for almost every
+# country), the upper-cased Natural Earth ADMIN name and the '|'-separated raw names that stand for it
+country_dimension_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "countries.tsv")
+
+country_columns = ["country_id", "iso_a3", "ADMIN"]
+
+
+def read_country_dimension(path=country_dimension_path):
+    """A function used to read the country dimension table.
+
+    Parameters
+    ----------
+    str:
+        the filename of the country dimension TSV.
+
+    Returns
+    -------
+    dataframe:
+        the `country_id`, `iso_a3`, `ADMIN` and `aliases` columns.
+
+    Examples
+    --------
+    >>> countries = read_country_dimension()
+    """
+    return pd.read_csv(path, sep="\t", keep_default_na=False, na_values=[""], dtype={"aliases": object})
+
+
+def _normalize(name):
+    return " ".join(str(name).upper().split())
+
+
+def country_lookup(countries=None):
+    """A function used to map every known raw country name (the ADMIN names and their aliases) to its ISO code.
+
+    Parameters
+    ----------
+    dataframe:
+        the country dimension; read from `countries.tsv` if None.
+
+    Returns
+    -------
+    dictionary:
+        the normalized raw name mapped to `iso_a3`.
+    """
+    if countries is None:
+        countries = read_country_dimension()
+    lookup = {}
+    for iso_a3, admin, aliases in countries[["iso_a3", "ADMIN", "aliases"]].itertuples(index=False, name=None):
+        lookup[_normalize(admin)] = iso_a3
+        if isinstance(aliases, str):
+            for alias in aliases.split("|"):
+                lookup[_normalize(alias)] = iso_a3
+    return lookup
+
+
+def locations_to_iso(locations, lookup=None):
+    """A function used to resolve the country of every `Locations` string to its ISO code.
+
+    The column is factorized so each distinct string is resolved once. Qualified names that the comma split
+    would cut in two ("Korea, Republic of", "Congo, The Democratic Republic of the") are tried on the last two
+    parts first, then the last part alone is looked up.
+
+    Parameters
+    ----------
+    series:
+        the `Locations` column.
+    dictionary:
+        the raw name to ISO code mapping, from `country_lookup`.
+
+    Returns
+    -------
+    series:
+        the ISO code of each row (NaN when missing or unknown), with the same index as `locations`.
+
+    Examples
+    --------
+    >>> df["Location_Country_ISO"] = locations_to_iso(df["Locations"])
+    """
+    if lookup is None:
+        lookup = country_lookup()
+    codes, uniques = pd.factorize(locations)
+
+    def resolve(location):
+        parts = [_normalize(part) for part in location.split(",")]
+        if len(parts) > 1 and f"{parts[-2]}, {parts[-1]}" in lookup:
+            return lookup[f"{parts[-2]}, {parts[-1]}"]
+        return lookup.get(parts[-1], np.nan)
+
+    # missing locations are coded -1, which picks the trailing NaN
+    iso = np.array([resolve(str(location)) for location in uniques] + [np.nan], dtype=object)
+    return pd.Series(iso[codes], index=locations.index, name="Location_Country_ISO")
+
+
+def names_to_iso(names, lookup=None):
+    """A function used to map a column of country names (e.g. `Location_Country`) to ISO codes, one lookup per distinct name.
+
+    Examples
+    --------
+    >>> names_to_iso(pd.Series(["UNITED STATES", "Russian Federation"])).tolist()
+    ['USA', 'RUS']
+    """
+    if lookup is None:
+        lookup = country_lookup()
+    codes, uniques = pd.factorize(names)
+    iso = np.array([lookup.get(_normalize(name), np.nan) for name in uniques] + [np.nan], dtype=object)
+    return pd.Series(iso[codes], index=names.index)
+
+
+def iso_to_admin(iso, countries=None):
+    """A function used to map ISO codes to the canonical (Natural Earth ADMIN) country names.
+
+    Examples
+    --------
+    >>> df["Location_Country"] = iso_to_admin(df["Location_Country_ISO"]).fillna(df["Location_Country"])
+    """
+    if countries is None:
+        countries = read_country_dimension()
+    return iso.map(countries.set_index("iso_a3")["ADMIN"])
+
+
+def add_country_columns(df, countries=None):
+    """A function used to add the `Location_Country_ISO` key and replace `Location_Country` by its canonical name.
+
+    Countries missing from the dimension keep their parsed name and get a missing ISO code.
+
+    Parameters
+    ----------
+    dataframe:
+        the trials, with the `Locations` and `Location_Country` columns.
+    dataframe:
+        the country dimension; read from `countries.tsv` if None.
+
+    Returns
+    -------
+    dataframe:
+        the trials with the canonical country name and its ISO code.
+
+    Examples
+    --------
+    >>> covid_trials_df = add_country_columns(covid_trials_df.join(parse_locations(covid_trials_df["Locations"])))
+    """
+    if countries is None:
+        countries = read_country_dimension()
+    df["Location_Country_ISO"] = locations_to_iso(df["Locations"], country_lookup(countries))
+    df["Location_Country"] = iso_to_admin(df["Location_Country_ISO"], countries).fillna(df["Location_Country"])
+    return df
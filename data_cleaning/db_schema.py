@@ -0,0 +1,237 @@
+import sqlite3
+
+study_design_list = ["ALLOCATION",
+                     "INTERVENTION MODEL",
+                     "MASKING",
+                     "PRIMARY PURPOSE",
+                     "OBSERVATIONAL MODEL",
+                     "TIME PERSPECTIVE"]
+
+intervention_list = ['DRUG', 'PROCEDURE', 'OTHER', 'DEVICE', 'BIOLOGICAL', 'DIAGNOSTIC TEST',
+                     'DIETARY SUPPLEMENT', 'GENETIC', 'COMBINATION PRODUCT', 'BEHAVIORAL', 'RADIATION']
+
+
+def _columns_ddl(columns, sql_type="TEXT"):
+    return ",\n    ".join(f'"{c}" {sql_type}' for c in columns)
+
+
+# trial_info is the parent table; every other table references it by "NCT Number", and it references the
+# countries dimension by ISO code
+schema = {
+    'countries': '''
+CREATE TABLE countries (
+    "country_id" INTEGER PRIMARY KEY,
+    "iso_a3" TEXT NOT NULL UNIQUE,
+    "ADMIN" TEXT NOT NULL
+)''',
+    'trial_info': '''
+CREATE TABLE trial_info (
+    "NCT Number" TEXT PRIMARY KEY,
+    "Title" TEXT,
+    "Locations" TEXT,
+    "Status" TEXT,
+    "Study Results" TEXT,
+    "Conditions" TEXT,
+    "Gender" TEXT,
+    "Age" TEXT,
+    "Phases" TEXT,
+    "Enrollment" INTEGER,
+    "URL" TEXT,
+    "Location_Country" TEXT,
+    "Location_Country_ISO" TEXT REFERENCES countries ("iso_a3"),
+    "Location_City_or_State" TEXT,
+    "Location_Institution" TEXT,
+    "Start Date" TEXT,
+    "Completion Date" TEXT,
+    "First Posted" TEXT,
+    "Last Update Posted" TEXT,
+    "Funded Bys" TEXT,
+    "Study Type" TEXT
+)''',
+    'study_designs': f'''
+CREATE TABLE study_designs (
+    "NCT Number" TEXT PRIMARY KEY REFERENCES trial_info ("NCT Number") ON DELETE CASCADE,
+    {_columns_ddl(study_design_list)}
+)''',
+    'interventions': f'''
+CREATE TABLE interventions (
+    "NCT Number" TEXT PRIMARY KEY REFERENCES trial_info ("NCT Number") ON DELETE CASCADE,
+    {_columns_ddl(intervention_list)}
+)''',
+    'outcome_measures': '''
+CREATE TABLE outcome_measures (
+    "NCT Number" TEXT NOT NULL REFERENCES trial_info ("NCT Number") ON DELETE CASCADE,
+    "Outcome Measures" TEXT,
+    "index" INTEGER PRIMARY KEY
+)''',
+    'sponsor_collaborators': '''
+CREATE TABLE sponsor_collaborators (
+    "NCT Number" TEXT NOT NULL REFERENCES trial_info ("NCT Number") ON DELETE CASCADE,
+    "Sponsor/Collaborators" TEXT,
+    "index" INTEGER PRIMARY KEY
+)''',
+    'funded_bys': '''
+CREATE TABLE funded_bys (
+    "NCT Number" TEXT NOT NULL REFERENCES trial_info ("NCT Number") ON DELETE CASCADE,
+    "Funded Bys" TEXT,
+    "index" INTEGER PRIMARY KEY
+)''',
+    'study_type': '''
+CREATE TABLE study_type (
+    "NCT Number" TEXT NOT NULL REFERENCES trial_info ("NCT Number") ON DELETE CASCADE,
+    "Study Type" TEXT,
+    "index" INTEGER PRIMARY KEY
+)''',
+    'trial_sites': '''
+CREATE TABLE trial_sites (
+    "NCT Number" TEXT NOT NULL REFERENCES trial_info ("NCT Number") ON DELETE CASCADE,
+    "Location" TEXT,
+    "Location_Country" TEXT,
+    "Location_City_or_State" TEXT,
+    "Location_Institution" TEXT,
+    "Location_Country_ISO" TEXT REFERENCES countries ("iso_a3"),
+    "index" INTEGER PRIMARY KEY
+)''',
+    'trial_versions': '''
+CREATE TABLE trial_versions (
+    "NCT Number" TEXT PRIMARY KEY REFERENCES trial_info ("NCT Number") ON DELETE CASCADE,
+    "Last Update Posted" TEXT,
+    "Row Hash" INTEGER
+)''',
+}
+
+indexes = [
+    'CREATE INDEX idx_trial_info_country ON trial_info ("Location_Country", "NCT Number")',
+    'CREATE INDEX idx_trial_info_country_iso ON trial_info ("Location_Country_ISO", "NCT Number")',
+    'CREATE INDEX idx_trial_info_status ON trial_info ("Status", "NCT Number")',
+    'CREATE INDEX idx_trial_info_phases ON trial_info ("Phases", "NCT Number")',
+    'CREATE INDEX idx_outcome_measures_nct ON outcome_measures ("NCT Number")',
+    'CREATE INDEX idx_sponsor_collaborators_nct ON sponsor_collaborators ("NCT Number")',
+    'CREATE INDEX idx_funded_bys_nct ON funded_bys ("NCT Number", "Funded Bys")',
+    'CREATE INDEX idx_study_type_nct ON study_type ("NCT Number", "Study Type")',
+    'CREATE INDEX idx_trial_sites_nct ON trial_sites ("NCT Number")',
+    'CREATE INDEX idx_trial_sites_country_state ON trial_sites ("Location_Country_ISO", "Location_City_or_State", "NCT Number")',
+]
+
+# parents before children, so the foreign keys hold while loading
+load_order = list(schema)
+
+
+def connect(db_path):
+    """A function used to open the database with WAL journaling and foreign keys enforced.
+
+    Parameters
+    ----------
+    str:
+        the filename of the SQLite database.
+
+    Returns
+    -------
+    connection:
+        the sqlite3 connection.
+
+    Examples
+    --------
+    >>> conn = connect('covid_trials.db')
+    """
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute('PRAGMA foreign_keys = ON')
+    return conn
+
+
+def _execute_schema(conn):
+    for name in reversed(load_order):
+        conn.execute(f'DROP TABLE IF EXISTS {name}')
+    for name in load_order:
+        conn.execute(schema[name])
+    for statement in indexes:
+        conn.execute(statement)
+
+
+def create_schema(conn):
+    """A function used to (re)create every table and index of the database in one transaction.
+
+    sqlite3 does not open a transaction for DDL by itself, so it is opened explicitly: if a statement fails, the
+    previous tables are left as they were.
+
+    Parameters
+    ----------
+    connection:
+        the sqlite3 connection.
+
+    Examples
+    --------
+    >>> create_schema(conn)
+    """
+    conn.execute('BEGIN')
+    try:
+        _execute_schema(conn)
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+def bulk_insert(conn, name, df):
+    """A function used to insert a dataframe into an existing table with a single `executemany`.
+
+    Parameters
+    ----------
+    connection:
+        the sqlite3 connection.
+    str:
+        the table name.
+    dataframe:
+        the rows to insert; its columns must exist in the table.
+
+    Examples
+    --------
+    >>> bulk_insert(conn, 'trial_info', trial_info)
+    """
+    columns = ", ".join(f'"{c}"' for c in df.columns)
+    placeholders = ", ".join("?" * df.shape[1])
+    # NaN -> NULL, and numpy scalars -> python scalars that sqlite3 can bind
+    rows = df.astype(object).where(df.notnull(), None).itertuples(index=False, name=None)
+    conn.executemany(f'INSERT INTO {name} ({columns}) VALUES ({placeholders})', rows)
+
+
+def load_tables(conn, tables):
+    """A function used to create the schema and bulk-load every table in one transaction.
+
+    The tables are dropped, recreated and filled in the same explicit transaction, so a failed insert (e.g. a
+    foreign key violation) rolls the database back to its previous content instead of leaving it empty.
+
+    Parameters
+    ----------
+    connection:
+        the sqlite3 connection, preferably from `connect`.
+    dictionary or iterable:
+        the table name mapped to its dataframe, or an iterable of such dictionaries (e.g. one per chunk of the
+        export) that are inserted one after the other; the 'index' pk of each chunk continues after the previous one.
+
+    Examples
+    --------
+    >>> load_tables(connect('covid_trials.db'), tables)
+    """
+    if isinstance(tables, dict):
+        tables = [tables]
+    next_index = {}
+    conn.execute('BEGIN')
+    try:
+        _execute_schema(conn)
+        for chunk in tables:
+            for name in load_order:
+                if name not in chunk:
+                    continue
+                table = chunk[name]
+                if 'index' in table.columns and table.shape[0] > 0:
+                    table = table.assign(index=table['index'] + next_index.get(name, 0))
+                    next_index[name] = int(table['index'].max()) + 1
+                bulk_insert(conn, name, table)
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+    conn.execute('ANALYZE')
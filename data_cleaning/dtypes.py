@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+
+# low-cardinality columns that are always stored as categoricals
+categorical_columns = ['Status', 'Phases', 'Gender', 'Age', 'Study Type', 'Location_Country']
+
+
+def upper_case_columns(df):
+    """A function used to upper-case every string cell of a dataframe, column by column.
+
+    Each object column is factorized, only its distinct values are upper-cased, and the result is broadcast
+    back with an integer take; non-string cells (NaN, numbers) are left untouched.
+
+    Parameters
+    ----------
+    dataframe:
+        the dataframe.
+
+    Returns
+    -------
+    dataframe:
+        the dataframe with upper-cased strings.
+
+    Examples
+    --------
+    >>> df = upper_case_columns(df)
+    """
+    for col in df.columns[df.dtypes == object]:
+        codes, uniques = pd.factorize(df[col])
+        upper = np.array([s.upper() if type(s) == str else s for s in uniques] + [np.nan], dtype=object)
+        # missing cells are coded -1, which picks the trailing NaN
+        df[col] = upper[codes]
+    return df
+
+
+def optimize_dtypes(df, categorical_columns=categorical_columns, max_unique_ratio=0.5):
+    """A function used to shrink the memory of a dataframe with categoricals and downcast numerics.
+
+    Parameters
+    ----------
+    dataframe:
+        the dataframe.
+    list:
+        columns converted to categoricals whenever they are present and hold strings.
+    float:
+        other string columns are converted to categoricals when their share of distinct values is at most this.
+
+    Returns
+    -------
+    dataframe:
+        a copy of the dataframe with compact dtypes.
+
+    Examples
+    --------
+    >>> df = optimize_dtypes(df)
+    """
+    df = df.copy()
+    for col in df.columns:
+        s = df[col]
+        if s.dtype == object:
+            if pd.api.types.infer_dtype(s, skipna=True) != 'string':
+                continue
+            if col in categorical_columns or s.nunique() <= max_unique_ratio * len(s):
+                df[col] = s.astype('category')
+        elif pd.api.types.is_integer_dtype(s) and not pd.api.types.is_bool_dtype(s):
+            df[col] = pd.to_numeric(s, downcast='integer')
+        elif pd.api.types.is_float_dtype(s):
+            downcast = s.astype(np.float32)
+            # only keep float32 when it represents every value exactly
+            if ((downcast.astype(np.float64) == s) | s.isnull()).all():
+                df[col] = downcast
+    return df
+
+
+def memory_report(tables, optimized_tables):
+    """A function used to compare the memory of tables before and after `optimize_dtypes`.
+
+    Parameters
+    ----------
+    dictionary:
+        the table name mapped to the original dataframe.
+    dictionary:
+        the table name mapped to the optimized dataframe.
+
+    Returns
+    -------
+    dataframe:
+        one row per table with the memory in MB before and after, and the share saved.
+
+    Examples
+    --------
+    >>> print(memory_report(tables, {name: optimize_dtypes(t) for name, t in tables.items()}))
+    """
+    before = pd.Series({name: t.memory_usage(deep=True).sum() for name, t in tables.items()})
+    after = pd.Series({name: optimized_tables[name].memory_usage(deep=True).sum() for name in tables})
+    return pd.DataFrame({'before_mb': before / 2 ** 20,
+                         'after_mb': after / 2 ** 20,
+                         'saved': 1 - after / before}).round(3)
@@ -0,0 +1,135 @@
+import bisect
+import collections
+import math
+
+import pandas as pd
+
+from geocode_cache import normalize_name
+
+# same attributes as the geopy Location objects the rest of the ETL reads
+Location = collections.namedtuple("Location", ["address", "latitude", "longitude"])
+
+gazetteer_columns = ["name", "kind", "lat", "lon", "address"]
+
+
+class GazetteerGeocoder:
+    """A class used to geocode names offline against a local gazetteer of institutions, cities and states.
+
+    It is called like the Nominatim `geocode` function (one name in, a Location or None out), so it can be
+    passed anywhere a geocoder is expected. A name is looked up, in order, by its exact normalized form, as the
+    prefix of a single gazetteer entry, and then fuzzily by the IDF-weighted Jaccard similarity of its tokens.
+    """
+
+    def __init__(self, gazetteer, min_similarity=0.6, max_candidate_tokens=3, max_postings=1000):
+        """
+        Parameters
+        ----------
+        dataframe:
+            the gazetteer, with the columns in `gazetteer_columns` (`address` may be missing).
+        float:
+            the smallest similarity accepted for a fuzzy match.
+        int:
+            candidates for a fuzzy match are the entries sharing one of this many rarest tokens of the query.
+        int:
+            beyond the rarest one, tokens listed for more entries than this are not used to gather candidates.
+        """
+        gazetteer = gazetteer.dropna(subset=["name", "lat", "lon"]).reset_index(drop=True)
+        if "address" not in gazetteer:
+            gazetteer = gazetteer.assign(address=gazetteer["name"])
+        self.min_similarity = min_similarity
+        self.max_candidate_tokens = max_candidate_tokens
+        self.max_postings = max_postings
+
+        self.locations = [Location(address if isinstance(address, str) else name, lat, lon)
+                          for name, address, lat, lon
+                          in gazetteer[["name", "address", "lat", "lon"]].itertuples(index=False, name=None)]
+        keys = [normalize_name(name) for name in gazetteer["name"]]
+
+        # exact index: the first entry wins for duplicated names (institutions are listed before cities and states)
+        self.exact = {}
+        for i, key in enumerate(keys):
+            self.exact.setdefault(key, i)
+
+        # prefix index: the normalized names, sorted, searched with bisect
+        self.sorted_keys = sorted(self.exact)
+
+        # token index: token -> entry ids, and the token sets with their IDF weights for scoring
+        self.tokens = [frozenset(key.split()) for key in keys]
+        self.postings = collections.defaultdict(list)
+        for i, tokens in enumerate(self.tokens):
+            for token in tokens:
+                self.postings[token].append(i)
+        n = len(keys)
+        self.idf = {token: math.log(1 + n / len(ids)) for token, ids in self.postings.items()}
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        """A function used to build the geocoder from a gazetteer TSV file.
+
+        Examples
+        --------
+        >>> geocode = GazetteerGeocoder.from_file("data/gazetteer_us.tsv")
+        """
+        return cls(pd.read_csv(path, sep="\t"), **kwargs)
+
+    def _weight(self, tokens):
+        # tokens missing from the gazetteer get the weight of the rarest possible token
+        default = math.log(1 + len(self.tokens))
+        return sum(self.idf.get(token, default) for token in tokens)
+
+    def _prefix(self, key):
+        start = bisect.bisect_left(self.sorted_keys, key)
+        end = bisect.bisect_left(self.sorted_keys, key + "\uffff")
+        if end - start == 1:
+            return self.exact[self.sorted_keys[start]]
+        return None
+
+    def _fuzzy(self, key):
+        query = frozenset(key.split())
+        known = sorted((token for token in query if token in self.postings), key=lambda t: len(self.postings[t]))
+        # no entry can score above the share of the query weight that the gazetteer knows about
+        if not known or self._weight(known) < self.min_similarity * self._weight(query):
+            return None
+
+        # the rarest token always contributes candidates; more common ones only while their postings stay short
+        candidates = set(self.postings[known[0]])
+        for token in known[1:self.max_candidate_tokens]:
+            if len(self.postings[token]) > self.max_postings:
+                break
+            candidates.update(self.postings[token])
+
+        best, best_score = None, 0.0
+        # sorted, so that ties go to the entry listed first
+        for i in sorted(candidates):
+            tokens = self.tokens[i]
+            score = self._weight(query & tokens) / self._weight(query | tokens)
+            if score > best_score:
+                best, best_score = i, score
+        return best if best_score >= self.min_similarity else None
+
+    def lookup(self, name):
+        """A function used to find the gazetteer entry of a name.
+
+        Parameters
+        ----------
+        str:
+            the name, e.g. an institution.
+
+        Returns
+        -------
+        int:
+            the position of the entry in the gazetteer, or None.
+        """
+        key = normalize_name(name)
+        if not key:
+            return None
+        i = self.exact.get(key)
+        if i is None:
+            i = self._prefix(key)
+        if i is None:
+            i = self._fuzzy(key)
+        return i
+
+    def __call__(self, name):
+        i = self.lookup(name)
+        return None if i is None else self.locations[i]
@@ -0,0 +1,156 @@
+import re
+import sqlite3
+import time
+
+import pandas as pd
+
+geocode_columns = ["Address", "lat", "lon"]
+
+schema = '''
+CREATE TABLE IF NOT EXISTS geocodes (
+    "key" TEXT PRIMARY KEY,
+    "query" TEXT,
+    "Address" TEXT,
+    "lat" REAL,
+    "lon" REAL,
+    "found" INTEGER NOT NULL,
+    "geocoded_at" REAL
+)'''
+
+
+def normalize_name(name):
+    """A function used to normalize an institution name into the key of the geocode cache.
+
+    Parameters
+    ----------
+    str:
+        the institution name.
+
+    Returns
+    -------
+    str:
+        the name upper-cased, with punctuation dropped and whitespace collapsed.
+
+    Examples
+    --------
+    >>> normalize_name("  Mayo Clinic,  Rochester ")
+    'MAYO CLINIC ROCHESTER'
+    """
+    name = re.sub(r"[^\w\s&]", " ", str(name).upper())
+    return " ".join(name.split())
+
+
+class GeocodeCache:
+    """A class used to keep geocoding results in a SQLite file between runs.
+
+    Lookups that found nothing are stored as well (with `found` = 0), so they are not retried on every run.
+    """
+
+    def __init__(self, path="geocode_cache.db"):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        with self.conn:
+            self.conn.execute(schema)
+
+    def get_many(self, keys):
+        """A function used to read the cached results of the given keys.
+
+        Parameters
+        ----------
+        list:
+            the normalized names.
+
+        Returns
+        -------
+        dictionary:
+            the key mapped to its (Address, lat, lon) tuple, for the keys that are cached.
+        """
+        keys = list(keys)
+        found = {}
+        # stay under SQLite's limit on the number of bound parameters
+        for start in range(0, len(keys), 500):
+            block = keys[start:start + 500]
+            rows = self.conn.execute(
+                f'SELECT "key", "Address", "lat", "lon" FROM geocodes WHERE "key" IN ({", ".join("?" * len(block))})',
+                block)
+            found.update({row[0]: row[1:] for row in rows})
+        return found
+
+    def put_many(self, rows):
+        """A function used to store a batch of results in one transaction.
+
+        Parameters
+        ----------
+        list:
+            (key, query, Address, lat, lon) tuples; Address, lat and lon are None for a miss.
+        """
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO geocodes VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(key, query, address, lat, lon, int(address is not None), now)
+                 for key, query, address, lat, lon in rows])
+
+    def close(self):
+        self.conn.close()
+
+
+def geocode_all(names, geocode, cache, batch_size=50, progress=None):
+    """A function used to geocode institution names, only querying the ones missing from the cache.
+
+    New names are geocoded in batches and each batch is committed to the cache as soon as it is done, so an
+    interrupted run resumes after the last finished lookup instead of starting over.
+
+    Parameters
+    ----------
+    list:
+        the institution names (duplicates and names that normalize to the same key are geocoded once).
+    function:
+        the geocoder, called with one name; it returns an object with `address`, `latitude` and `longitude`
+        (e.g. a geopy Location) or None. Any callable works, e.g. a local stand-in for tests.
+    GeocodeCache:
+        the cache.
+    int:
+        the number of lookups per committed batch.
+    function:
+        optional wrapper for progress reporting over the pending names, e.g. `tqdm`.
+
+    Returns
+    -------
+    dataframe:
+        one row per distinct name with the columns `Location_Institution`, `Address`, `lat` and `lon`.
+
+    Examples
+    --------
+    >>> geocode_all(names, RateLimiter(Nominatim(user_agent="my_cov_trial_dash").geocode, min_delay_seconds=1),
+    ...             GeocodeCache("geocode_cache.db"))
+    """
+    names = pd.Series(pd.unique(pd.Series(names, dtype=object).dropna()), dtype=object)
+    keys = names.map(normalize_name)
+
+    cached = cache.get_many(pd.unique(keys))
+    pending = keys[~keys.isin(list(cached))].drop_duplicates()
+    pending_items = list(zip(pending, names[pending.index]))
+    if progress is not None:
+        pending_items = progress(pending_items)
+
+    batch = []
+    try:
+        for key, name in pending_items:
+            location = geocode(name)
+            if location is None:
+                batch.append((key, name, None, None, None))
+            else:
+                batch.append((key, name, location.address, location.latitude, location.longitude))
+            if len(batch) >= batch_size:
+                cache.put_many(batch)
+                cached.update({row[0]: row[2:] for row in batch})
+                batch = []
+    finally:
+        # keep what was geocoded before an interruption or a geocoder error
+        cache.put_many(batch)
+        cached.update({row[0]: row[2:] for row in batch})
+
+    results = pd.DataFrame([cached[key] for key in keys], columns=geocode_columns, index=names.index)
+    results.insert(0, "Location_Institution", names)
+    return results
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+
+def parse_key_value_field(values, keys):
+    """A function used to parse a '|'-separated "KEY: value" field (e.g. 'Study Designs', 'Interventions') into a wide dataframe.
+
+    The column is factorized first so that each distinct string is parsed once; the items of all distinct
+    strings are then split with vectorized string operations and pivoted to one column per key. As in the
+    old per-row parser, the value is the text between the first and the second ':' and, when a key occurs
+    several times in one cell, the last occurrence wins. Keys not in `keys` are ignored, and an item without ':'
+    ends the parsing of its cell: the old parser stopped at it, so the pairs after it are dropped as well.
+
+    Parameters
+    ----------
+    series:
+        the field to parse, e.g. "ALLOCATION: RANDOMIZED|MASKING: NONE (OPEN LABEL)".
+    list:
+        the keys to keep, in output column order.
+
+    Returns
+    -------
+    dataframe:
+        one column per key (NaN when absent), with the same index as `values`.
+
+    Examples
+    --------
+    >>> study_designs = study_designs.join(parse_key_value_field(study_designs['Study Designs'], study_design_list))
+    """
+    codes, uniques = pd.factorize(values)
+
+    items = pd.Series(uniques, dtype=object).str.split("|").explode()
+    pairs = items.str.split(":", n=2, expand=True)
+    if pairs.shape[1] > 1:
+        pairs = pd.DataFrame({"key": pairs[0].str.strip(), "value": pairs[1].str.strip()})
+        # drop the first item without ':' of each cell and everything after it
+        malformed = pairs["value"].isna().astype(int)
+        pairs = pairs[malformed.groupby(level=0).cummax() == 0]
+        pairs = pairs[pairs["key"].isin(keys) & pairs["value"].notna()]
+        # keep the last occurrence of a key within the same cell
+        pairs = pairs.reset_index().drop_duplicates(["index", "key"], keep="last")
+        parsed = pairs.pivot(index="index", columns="key", values="value")
+    else:
+        parsed = pd.DataFrame(columns=keys, dtype=object)
+
+    # one row per distinct string plus a trailing all-NaN row, which missing values (coded -1) pick
+    wide = parsed.reindex(index=np.arange(len(uniques) + 1), columns=keys).to_numpy(dtype=object)
+    return pd.DataFrame(wide[codes], index=values.index, columns=keys)
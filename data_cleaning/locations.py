@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+location_columns = ["Location_Country", "Location_City_or_State", "Location_Institution"]
+
+# raw country suffixes that are cut off by the comma split, and the name they stand for
+country_fixups = {"Islamic Republic of": "Iran",
+                  "The Democratic Republic of the": "Congo"}
+
+
+def split_location(location):
+    """A function used to split one location string into its (country, city/state, institution) parts.
+
+    Parameters
+    ----------
+    str:
+        a location, e.g. "Massachusetts General Hospital, Boston, Massachusetts, United States".
+
+    Returns
+    -------
+    tuple:
+        the fixed-up country, the city or state (the whole string if it has no comma) and the institution.
+
+    Examples
+    --------
+    >>> split_location("Hopital Bichat, Paris, France")
+    ('France', 'Paris', 'Hopital Bichat')
+    """
+    parts = location.split(",")
+    country = parts[-1].strip()
+    city_or_state = parts[-2].strip() if len(parts) > 1 else location
+    return country_fixups.get(country, country), city_or_state, parts[0].strip()
+
+
+def parse_locations(locations):
+    """A function used to parse the `Locations` strings into country, city/state and institution columns.
+
+    The column is factorized first, so each distinct location string is split only once (a single split
+    yields all three parts and the country fixup); the parsed rows are then broadcast back with an integer take.
+
+    Parameters
+    ----------
+    series:
+        the `Locations` column.
+
+    Returns
+    -------
+    dataframe:
+        a dataframe with the same index as `locations` and the columns in `location_columns`.
+
+    Examples
+    --------
+    >>> df = df.join(parse_locations(df["Locations"]))
+    """
+    # missing locations are parsed as the string "nan", as before
+    codes, uniques = pd.factorize(locations.astype(str))
+    parsed = np.empty((len(uniques), len(location_columns)), dtype=object)
+    parsed[:] = [split_location(location) for location in uniques]
+    return pd.DataFrame(parsed[codes], index=locations.index, columns=location_columns)
@@ -1,33 +1,151 @@
+import argparse
+import sqlite3
+
 import pandas as pd
 
-from geopy.extra.rate_limiter import RateLimiter
-from geopy.geocoders import Nominatim
 from tqdm import tqdm
 
-## Get geographic information
+from write_columnar import write_columnar
+from gazetteer import GazetteerGeocoder
+from geocode_cache import GeocodeCache, geocode_all
+from locations import location_columns
+from name_blocking import block_names
+from us_states import names_to_state_codes, state_counts
+
+
+def read_us_trials(filename="data/cleaned_covid_studies_092020.tsv", db_path="covid_trials.db"):
+    """A function used to read the US sites of the cleaned trials, one row per trial and site.
+
+    The sites come from the `trial_sites` table, so a multi-site trial appears once per US site (the
+    trial-level location columns, which only describe its last site, are replaced by the site ones).
+
+    Parameters
+    ----------
+    str:
+        the filename of the cleaned trials TSV.
+    str:
+        the filename of the SQLite database holding `trial_sites`.
+
+    Returns
+    -------
+    dataframe:
+        the US trial sites.
+
+    Examples
+    --------
+    >>> us_data_df = read_us_trials()
+    """
+    data_df = pd.read_csv(filename, sep="\t")
+    conn = sqlite3.connect(db_path)
+    us_sites = pd.read_sql('select "NCT Number", "Location_Country", "Location_City_or_State", "Location_Institution" '
+                           'from trial_sites '
+                           'where "Location_Country_ISO" = \'USA\' order by "index"', conn)  # Subset to US only
+    conn.close()
+    trials = data_df.drop(columns=location_columns + ["Location_Country_ISO"]).drop_duplicates("NCT Number")
+    return trials.merge(us_sites, on="NCT Number").drop_duplicates(["NCT Number"] + location_columns)
+
+
+def nominatim_geocoder():
+    """A function used to build the rate-limited Nominatim geocoder.
+
+    Errors are raised rather than swallowed, so that a failed lookup is retried on the next run instead of
+    being cached as a miss.
+    """
+    from geopy.extra.rate_limiter import RateLimiter
+    from geopy.geocoders import Nominatim
+
+    geolocator = Nominatim(user_agent="my_cov_trial_dash")
+    return RateLimiter(geolocator.geocode, min_delay_seconds=1, swallow_exceptions=False)
+
+
+def add_geo(us_data_df, geocode, cache_path="data/geocode_cache.db", batch_size=50):
+    """A function used to annotate the trials with the address and coordinates of their institution.
+
+    Near-duplicate institution names are grouped first (`name_blocking.block_names`): `Location_Institution`
+    is replaced by the canonical name of its group, the original is kept in `Location_Institution_Raw`, and
+    only the canonical names are geocoded.
+
+    Parameters
+    ----------
+    dataframe:
+        the US trials.
+    function:
+        the geocoder, e.g. `nominatim_geocoder()` or a local stand-in.
+    str:
+        the filename of the persistent geocode cache.
+    int:
+        the number of lookups committed to the cache at a time.
+
+    Returns
+    -------
+    dataframe:
+        the trials with the `Location_Institution_Raw`, `Address`, `lat` and `lon` columns.
+
+    Examples
+    --------
+    >>> us_data_df_with_geo = add_geo(read_us_trials(), nominatim_geocoder())
+    """
+    us_data_df = us_data_df.assign(Location_Institution_Raw=us_data_df["Location_Institution"])
+    us_data_df["Location_Institution"] = us_data_df["Location_Institution"].map(block_names(us_data_df["Location_Institution"]))
+
+    cache = GeocodeCache(cache_path)
+    try:
+        unique_locations = geocode_all(us_data_df["Location_Institution"].dropna().unique(), geocode, cache,
+                                       batch_size=batch_size, progress=tqdm)
+    finally:
+        cache.close()
+    return us_data_df.merge(unique_locations, how="left")
+
+
+def add_intervention_columns(us_data_df_with_geo):
+    """A function used to add the `Intervention Type` and `Drug Type` columns from the first intervention.
+
+    Parameters
+    ----------
+    dataframe:
+        the trials.
 
-# Read in data, subset to US only, and annotate with geographic coordinates
-data_df = pd.read_csv("data/cleaned_covid_studies_092020.tsv", sep="\t")
-us_data_df = data_df[data_df["Location_Country"] == "UNITED STATES"] #  Subset to US only
+    Returns
+    -------
+    dataframe:
+        the trials with the two new columns.
+    """
+    # Intervention type
+    us_data_df_with_geo["Intervention Type"] = list([str(i).split(": ")[0] for i in list(us_data_df_with_geo["Interventions"])])
 
-# Geocode US locations
-geolocator = Nominatim(user_agent="my_cov_trial_dash")
-geocode = RateLimiter(geolocator.geocode, min_delay_seconds=1)
-unique_locations = pd.DataFrame.from_dict({"Location_Institution": list(us_data_df["Location_Institution"].unique())})
+    # Drug type
+    us_data_df_with_geo["Drug Type"] = [str(i).split(": ")[1] if str(i).split(": ")[0] in ["DRUG", "BIOLOGICAL"] else None for i in list(us_data_df_with_geo["Interventions"])]
+    return us_data_df_with_geo
 
-tqdm.pandas()
-unique_locations["Address"] = unique_locations["Location_Institution"].progress_apply(geocode)
-unique_locations["lat"] = [i.latitude if i is not None else None for i in unique_locations["Address"]]
-unique_locations["lon"] = [i.longitude if i is not None else None for i in unique_locations["Address"]]
 
-us_data_df_with_geo = us_data_df.merge(unique_locations, how="left")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Geocode the US trials and add the intervention columns.")
+    parser.add_argument("--db", default="covid_trials.db")
+    parser.add_argument("--cache", default="data/geocode_cache.db",
+                        help="SQLite file keeping geocoding results between runs")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--gazetteer", default=None,
+                        help="geocode offline against this gazetteer TSV (name, kind, lat, lon, address) "
+                             "instead of Nominatim")
+    args = parser.parse_args()
 
-## Add intervention type & drug columns
+    ## Get geographic information
+    if args.gazetteer is not None:
+        # offline lookups are fast, and their misses must not hide institutions from a later Nominatim run
+        geocode, cache_path = GazetteerGeocoder.from_file(args.gazetteer), ":memory:"
+    else:
+        geocode, cache_path = nominatim_geocoder(), args.cache
+    us_data_df_with_geo = add_geo(read_us_trials(db_path=args.db), geocode, cache_path, args.batch_size)
 
-# Intervention type
-us_data_df_with_geo["Intervention Type"] = list([str(i).split(": ")[0] for i in list(us_data_df_with_geo["Interventions"])])
+    ## Add intervention type & drug columns
+    us_data_df_with_geo = add_intervention_columns(us_data_df_with_geo)
 
-# Drug type
-us_data_df_with_geo["Drug Type"] = [str(i).split(": ")[1] if str(i).split(": ")[0] in ["DRUG", "BIOLOGICAL"] else None for i in list(us_data_df_with_geo["Interventions"])]
+    ## Precompute the state-level counts drawn by the state overview map
+    # (the key stays out of the site-level output, whose loader drops rows with any missing value)
+    state_count_df = state_counts(us_data_df_with_geo.assign(
+        state_code=names_to_state_codes(us_data_df_with_geo["Location_City_or_State"])))
+    state_count_df.to_csv("data/us_state_counts.tsv", sep="\t", index=False)
+    write_columnar(state_count_df, "data/us_state_counts.feather")
 
-us_data_df_with_geo.to_csv("data/cleaned_us_covid_studies_with_geo_092020.tsv", sep="\t")
+    us_data_df_with_geo.to_csv("data/cleaned_us_covid_studies_with_geo_092020.tsv", sep="\t")
+    write_columnar(us_data_df_with_geo, "data/cleaned_us_covid_studies_with_geo_092020.feather")
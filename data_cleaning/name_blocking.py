@@ -0,0 +1,162 @@
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from geocode_cache import normalize_name
+
+# common abbreviations in institution names, and the word they stand for
+abbreviations = {"HOSP": "HOSPITAL", "HOSPS": "HOSPITALS", "UNIV": "UNIVERSITY",
+                 "CTR": "CENTER", "CNTR": "CENTER", "CENTRE": "CENTER", "MED": "MEDICAL", "INST": "INSTITUTE",
+                 "ST": "SAINT", "MT": "MOUNT", "CHILDRENS": "CHILDREN", "DEPT": "DEPARTMENT", "NATL": "NATIONAL",
+                 "HLTH": "HEALTH", "RES": "RESEARCH", "&": "AND"}
+
+stopwords = {"THE", "OF", "AND", "AT", "FOR", "INC", "LLC"}
+
+# a large prime for the universal hash family of the MinHash permutations
+_prime = (1 << 61) - 1
+
+
+def normalize_tokens(name):
+    """A function used to normalize an institution name into the token string compared when blocking.
+
+    Parameters
+    ----------
+    str:
+        the institution name.
+
+    Returns
+    -------
+    str:
+        the `normalize_name` form with abbreviations expanded and stopwords dropped.
+
+    Examples
+    --------
+    >>> normalize_tokens("Massachusetts General Hosp.")
+    'MASSACHUSETTS GENERAL HOSPITAL'
+    """
+    tokens = (abbreviations.get(token, token) for token in normalize_name(name).split())
+    return " ".join(token for token in tokens if token not in stopwords)
+
+
+def shingles(text, k=3):
+    """A function used to hash the character k-grams of a string into a set of 32-bit integers."""
+    text = f" {text} "
+    return {zlib.crc32(text[i:i + k].encode()) for i in range(max(len(text) - k + 1, 1))}
+
+
+def minhash_signatures(shingle_sets, num_perm=64, seed=823):
+    """A function used to compute the MinHash signature of each shingle set.
+
+    Parameters
+    ----------
+    list:
+        the shingle sets, from `shingles`.
+    int:
+        the number of hash permutations (the signature length).
+    int:
+        the seed of the permutations, fixed so that signatures are reproducible.
+
+    Returns
+    -------
+    array:
+        one row of `num_perm` minimum hashes per set.
+    """
+    rng = np.random.RandomState(seed)
+    a = rng.randint(1, 1 << 31, size=(num_perm, 1), dtype=np.int64).astype(np.uint64)
+    b = rng.randint(0, 1 << 31, size=(num_perm, 1), dtype=np.int64).astype(np.uint64)
+    signatures = np.empty((len(shingle_sets), num_perm), dtype=np.uint64)
+    for i, hashes in enumerate(shingle_sets):
+        values = np.fromiter(hashes, dtype=np.uint64, count=len(hashes))[np.newaxis, :]
+        # a and the values fit in 32 bits, so a * values + b does not overflow 64 bits
+        signatures[i] = ((a * values + b) % _prime).min(axis=1)
+    return signatures
+
+
+def lsh_candidate_pairs(signatures, bands=16):
+    """A function used to find the pairs of signatures that agree on at least one band.
+
+    Parameters
+    ----------
+    array:
+        the MinHash signatures, one row per item.
+    int:
+        the number of bands the signatures are cut into; with r rows per band, pairs of Jaccard similarity s
+        become candidates with probability 1 - (1 - s ** r) ** bands.
+
+    Returns
+    -------
+    set:
+        the (i, j) candidate pairs with i < j.
+    """
+    rows = signatures.shape[1] // bands
+    pairs = set()
+    for band in range(bands):
+        buckets = {}
+        for i, key in enumerate(map(bytes, signatures[:, band * rows:(band + 1) * rows])):
+            buckets.setdefault(key, []).append(i)
+        for members in buckets.values():
+            for x in range(len(members)):
+                for y in range(x + 1, len(members)):
+                    pairs.add((members[x], members[y]))
+    return pairs
+
+
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def block_names(names, threshold=0.85, num_perm=64, bands=16):
+    """A function used to group near-duplicate institution names and pick one canonical name per group.
+
+    Names with the same `normalize_tokens` form are grouped directly. The distinct forms are then compared with
+    MinHash/LSH on character 3-grams, and candidate pairs whose exact 3-gram Jaccard similarity is at least
+    `threshold` (and that have the same digits, so "BUILDING 1" and "BUILDING 2" stay apart) are merged.
+
+    Parameters
+    ----------
+    series:
+        the institution name of every row (missing values are ignored).
+    float:
+        the smallest 3-gram Jaccard similarity for two forms to be merged.
+    int:
+        the MinHash signature length.
+    int:
+        the number of LSH bands.
+
+    Returns
+    -------
+    series:
+        the distinct raw names mapped to the canonical name of their group, which is the group's most frequent
+        raw name (the longest one on ties).
+
+    Examples
+    --------
+    >>> canonical = block_names(us_data_df["Location_Institution"])
+    >>> us_data_df["Location_Institution"] = us_data_df["Location_Institution"].map(canonical)
+    """
+    counts = pd.Series(names, dtype=object).dropna().value_counts(sort=False)
+    forms = counts.index.map(normalize_tokens)
+    form_codes, unique_forms = pd.factorize(forms)
+
+    shingle_sets = [shingles(form) for form in unique_forms]
+    digits = ["".join(filter(str.isdigit, form)) for form in unique_forms]
+    parent = list(range(len(unique_forms)))
+    if len(unique_forms) > 1:
+        for i, j in lsh_candidate_pairs(minhash_signatures(shingle_sets, num_perm), bands):
+            if digits[i] != digits[j]:
+                continue
+            similarity = len(shingle_sets[i] & shingle_sets[j]) / len(shingle_sets[i] | shingle_sets[j])
+            if similarity >= threshold:
+                parent[_find(parent, i)] = _find(parent, j)
+
+    groups = pd.Series([_find(parent, code) for code in form_codes], index=counts.index)
+    # most frequent raw name first, then the longest (least abbreviated), then alphabetically for determinism
+    ranked = pd.DataFrame({"group": groups, "count": counts, "length": counts.index.str.len(),
+                           "name": counts.index}).sort_values(["count", "length", "name"],
+                                                               ascending=[False, False, True])
+    canonical = ranked.drop_duplicates("group").set_index("group")["name"]
+    return groups.map(canonical)
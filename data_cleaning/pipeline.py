@@ -0,0 +1,264 @@
+import argparse
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import sys
+
+data_cleaning_dir = os.path.dirname(os.path.abspath(__file__))
+repo_dir = os.path.dirname(data_cleaning_dir)
+
+manifest_filename = ".pipeline_manifest.json"
+
+
+class Stage:
+    """A class used to describe one step of the ETL.
+
+    The script is run with `args` in the working directory; it reads `inputs` and writes `outputs`, both given
+    relative to the working directory.
+    """
+
+    def __init__(self, name, script, args, inputs, outputs):
+        self.name = name
+        self.script = script
+        self.args = args
+        self.inputs = inputs
+        self.outputs = outputs
+
+
+stages = [
+    Stage("clean",
+          os.path.join(data_cleaning_dir, "clean_data.py"),
+          ["data/SearchResults_new.tsv", "--db", "covid_trials.db",
+           "--cleaned-output", "data/cleaned_covid_studies_092020.tsv"],
+          # the country dimension is data, not code, so it is listed as an input (absolute paths are kept as is)
+          inputs=["data/SearchResults_new.tsv", os.path.join(data_cleaning_dir, "countries.tsv")],
+          outputs=["covid_trials.db", "data/cleaned_covid_studies_092020.tsv"]),
+    Stage("viz_cluster",
+          os.path.join(data_cleaning_dir, "clean_data_for_viz_cluster.py"),
+          [],
+          inputs=["covid_trials.db", "50m_cultural/ne_50m_admin_0_countries.shp"],
+          outputs=["cleaned_data_for_viz.tsv", "cleaned_data_for_map.tsv", "cleaned_data_for_map_with_geo.tsv",
+                   "cleaned_data_for_cluster.tsv", "cleaned_data_for_viz.feather", "cleaned_data_for_map.feather",
+                   "cleaned_data_for_map_with_geo.feather", "cleaned_data_for_cluster.feather",
+                   "cleaned_data_for_world_cube.tsv", "cleaned_data_for_world_cube.feather"]),
+    Stage("country_geometry",
+          os.path.join(data_cleaning_dir, "build_country_geometry.py"),
+          [],
+          inputs=["50m_cultural/ne_50m_admin_0_countries.shp"],
+          outputs=["country_geometry.feather"]),
+    Stage("geo",
+          os.path.join(data_cleaning_dir, "modify_us_study_data.py"),
+          [],
+          inputs=["data/cleaned_covid_studies_092020.tsv", "covid_trials.db",
+                  os.path.join(data_cleaning_dir, "us_states.tsv")],
+          outputs=["data/cleaned_us_covid_studies_with_geo_092020.tsv",
+                   "data/cleaned_us_covid_studies_with_geo_092020.feather",
+                   "data/us_state_counts.tsv", "data/us_state_counts.feather"]),
+    Stage("model_features",
+          os.path.join(repo_dir, "models", "predicting_active_status_of_trials", "clean_data_for_model.py"),
+          [],
+          inputs=["data/SearchResults_new.tsv"],
+          outputs=["data/X_train.csv", "data/X_test.csv", "data/y_train.csv", "data/y_test.csv",
+                   "data/df_ml_orig.csv"]),
+]
+
+
+def code_files(script):
+    """A function used to list the script of a stage and every local module it imports, recursively.
+
+    Parameters
+    ----------
+    str:
+        the path of the stage script.
+
+    Returns
+    -------
+    list:
+        the sorted python files; local modules are looked up next to the importing file and in data_cleaning/.
+
+    Examples
+    --------
+    >>> code_files("data_cleaning/clean_data.py")
+    """
+    seen = set()
+    to_visit = [os.path.abspath(script)]
+    while to_visit:
+        path = to_visit.pop()
+        if path in seen:
+            continue
+        seen.add(path)
+        with open(path) as f:
+            tree = ast.parse(f.read(), filename=path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                modules = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+                modules = [node.module]
+            else:
+                continue
+            for module in modules:
+                for directory in [os.path.dirname(path), data_cleaning_dir]:
+                    candidate = os.path.join(directory, module.split(".")[0] + ".py")
+                    if os.path.exists(candidate):
+                        to_visit.append(candidate)
+                        break
+    return sorted(seen)
+
+
+class FileHasher:
+    """A class used to hash file contents with sha256, memoized by (path, size, mtime) so that unchanged large
+    files are not re-read on every run."""
+
+    def __init__(self, cache=None):
+        self.cache = cache if cache is not None else {}
+
+    def __call__(self, path):
+        if not os.path.exists(path):
+            return None
+        stat = os.stat(path)
+        key = f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+        if key not in self.cache:
+            digest = hashlib.sha256()
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+            self.cache[key] = digest.hexdigest()
+        return self.cache[key]
+
+
+def stage_fingerprint(stage, workdir, file_hash):
+    """A function used to fingerprint a stage by its arguments, the content of its code and of its inputs.
+
+    Parameters
+    ----------
+    Stage:
+        the stage.
+    str:
+        the working directory the input paths are relative to.
+    FileHasher:
+        the memoized content hasher.
+
+    Returns
+    -------
+    str:
+        a sha256 hex digest, which changes whenever the stage could compute something different.
+
+    Examples
+    --------
+    >>> stage_fingerprint(stages[0], ".", FileHasher())
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([stage.name, stage.args]).encode())
+    for path in code_files(stage.script):
+        digest.update(os.path.relpath(path, repo_dir).encode())
+        digest.update(str(file_hash(path)).encode())
+    for path in stage.inputs:
+        digest.update(path.encode())
+        digest.update(str(file_hash(os.path.join(workdir, path))).encode())
+    return digest.hexdigest()
+
+
+def load_manifest(workdir):
+    path = os.path.join(workdir, manifest_filename)
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {"stages": {}, "file_hashes": {}}
+
+
+def save_manifest(workdir, manifest):
+    path = os.path.join(workdir, manifest_filename)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def outputs_valid(stage, workdir, record, file_hash):
+    """A function used to check that the outputs of a stage all exist and are the ones recorded when it last ran."""
+    if record is None:
+        return False
+    recorded = record.get("outputs", {})
+    return all(recorded.get(path) is not None and recorded.get(path) == file_hash(os.path.join(workdir, path))
+               for path in stage.outputs)
+
+
+def run_pipeline(workdir=".", only=None, force=(), dry_run=False):
+    """A function used to run the ETL stages in order, skipping every stage whose fingerprint and outputs are unchanged.
+
+    Parameters
+    ----------
+    str:
+        the directory holding the inputs and receiving the outputs (the scripts' relative paths resolve here).
+    list:
+        the names of the stages to consider, or None for all of them.
+    list:
+        the names of the stages to re-run even if they are up to date.
+    bool:
+        only report what would run.
+
+    Returns
+    -------
+    dictionary:
+        the stage name mapped to "skipped", "ran" or "would run".
+
+    Examples
+    --------
+    >>> run_pipeline(".", force=["model_features"])
+    """
+    workdir = os.path.abspath(workdir)
+    manifest = load_manifest(workdir)
+    file_hash = FileHasher(manifest["file_hashes"])
+    status = {}
+
+    for stage in stages:
+        if only is not None and stage.name not in only:
+            continue
+        fingerprint = stage_fingerprint(stage, workdir, file_hash)
+        record = manifest["stages"].get(stage.name)
+        up_to_date = (stage.name not in force
+                      and record is not None
+                      and record.get("fingerprint") == fingerprint
+                      and outputs_valid(stage, workdir, record, file_hash))
+        if up_to_date:
+            status[stage.name] = "skipped"
+            print(f"[{stage.name}] up to date, skipping")
+            continue
+        if dry_run:
+            status[stage.name] = "would run"
+            print(f"[{stage.name}] would run")
+            continue
+
+        print(f"[{stage.name}] running {os.path.relpath(stage.script, repo_dir)}")
+        subprocess.run([sys.executable, stage.script] + stage.args, cwd=workdir, check=True)
+        manifest["stages"][stage.name] = {
+            "fingerprint": fingerprint,
+            "outputs": {path: file_hash(os.path.join(workdir, path)) for path in stage.outputs},
+        }
+        # persist after every stage, so an interrupted run keeps the stages that finished
+        save_manifest(workdir, manifest)
+        status[stage.name] = "ran"
+
+    # drop memoized hashes of files that have since changed or disappeared
+    live_keys = set()
+    for key in list(file_hash.cache):
+        path, size, mtime = key.rsplit(":", 2)
+        if os.path.exists(path) and f"{os.stat(path).st_size}:{os.stat(path).st_mtime_ns}" == f"{size}:{mtime}":
+            live_keys.add(key)
+    manifest["file_hashes"] = {k: v for k, v in file_hash.cache.items() if k in live_keys}
+    if not dry_run:
+        save_manifest(workdir, manifest)
+    return status
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the ETL (clean -> viz/cluster -> geo -> model features), "
+                                                 "skipping stages whose inputs and code are unchanged.")
+    parser.add_argument("--workdir", default=".")
+    parser.add_argument("--only", nargs="+", choices=[s.name for s in stages], default=None)
+    parser.add_argument("--force", nargs="+", choices=[s.name for s in stages], default=[])
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    run_pipeline(args.workdir, only=args.only, force=args.force, dry_run=args.dry_run)
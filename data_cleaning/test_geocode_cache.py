@@ -0,0 +1,63 @@
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from geocode_cache import GeocodeCache, geocode_all, normalize_name
+
+
+class FakeGeocoder:
+    # a local stand-in for Nominatim that counts its calls; names in `missing` are not found and the call
+    # numbered `fail_on` raises, like a dropped connection
+    def __init__(self, missing=(), fail_on=None):
+        self.missing = set(missing)
+        self.fail_on = fail_on
+        self.calls = []
+
+    def __call__(self, name):
+        self.calls.append(name)
+        if len(self.calls) == self.fail_on:
+            raise ConnectionError("geocoder unavailable")
+        if name in self.missing:
+            return None
+        return SimpleNamespace(address=f"{name}, USA", latitude=float(len(name)), longitude=-float(len(name)))
+
+
+names = ["MAYO CLINIC", "Mayo Clinic,", "DUKE UNIVERSITY", "NOWHERE HOSPITAL", "EMORY UNIVERSITY",
+         "STANFORD UNIVERSITY", "YALE UNIVERSITY", None, "DUKE UNIVERSITY"]
+
+
+def test_misses_are_cached_and_a_second_run_makes_no_calls():
+    cache = GeocodeCache(":memory:")
+    geocoder = FakeGeocoder(missing=["NOWHERE HOSPITAL"])
+    first = geocode_all(names, geocoder, cache, batch_size=2)
+    # "Mayo Clinic," normalizes to the key of "MAYO CLINIC" and the duplicate is geocoded once
+    assert geocoder.calls == ["MAYO CLINIC", "DUKE UNIVERSITY", "NOWHERE HOSPITAL", "EMORY UNIVERSITY",
+                              "STANFORD UNIVERSITY", "YALE UNIVERSITY"]
+    assert first.set_index("Location_Institution").loc["NOWHERE HOSPITAL"].isna().all()
+    assert cache.conn.execute('SELECT "found" FROM geocodes WHERE "key" = ?',
+                              (normalize_name("NOWHERE HOSPITAL"),)).fetchone() == (0,)
+
+    second_geocoder = FakeGeocoder()
+    second = geocode_all(names, second_geocoder, cache, batch_size=2)
+    assert second_geocoder.calls == []
+    pd.testing.assert_frame_equal(second, first)
+    cache.close()
+
+
+def test_interrupted_run_resumes_with_the_names_never_seen(tmp_path):
+    path = str(tmp_path / "geocode_cache.db")
+    cache = GeocodeCache(path)
+    # the fourth call fails in the middle of the second batch of two
+    geocoder = FakeGeocoder(missing=["NOWHERE HOSPITAL"], fail_on=4)
+    with pytest.raises(ConnectionError):
+        geocode_all(names, geocoder, cache, batch_size=2)
+    cache.close()
+
+    cache = GeocodeCache(path)
+    resumed_geocoder = FakeGeocoder(missing=["NOWHERE HOSPITAL"])
+    resumed = geocode_all(names, resumed_geocoder, cache, batch_size=2)
+    # the lookups finished before the failure (the miss included) are kept, the failed one is retried
+    assert resumed_geocoder.calls == ["EMORY UNIVERSITY", "STANFORD UNIVERSITY", "YALE UNIVERSITY"]
+    assert resumed["lat"].notna().sum() == 6
+    cache.close()
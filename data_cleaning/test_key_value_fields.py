@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+
+from key_value_fields import parse_key_value_field
+
+keys = ["ALLOCATION", "MASKING", "PRIMARY PURPOSE"]
+
+
+def legacy_parse(value):
+    # the per-row parser of clean_data.process_study_design before parse_key_value_field
+    dic = {key: np.nan for key in keys}
+    try:
+        for item in value.split("|"):
+            item = item.split(":")
+            key = item[0].strip()
+            value = item[1].strip()
+            if key in dic:
+                dic[key] = value
+        return dic
+    except Exception:
+        return dic
+
+
+def test_malformed_item_stops_the_cell_like_the_legacy_parser():
+    values = pd.Series(["ALLOCATION: RANDOMIZED|NO COLON HERE|MASKING: NONE (OPEN LABEL)",
+                        "ALLOCATION: N/A|MASKING: DOUBLE|PRIMARY PURPOSE: TREATMENT",
+                        "MASKING: SINGLE|ALLOCATION: RANDOMIZED|MASKING: TRIPLE",
+                        "PRIMARY PURPOSE: PREVENTION|",
+                        np.nan,
+                        "ALLOCATION: RANDOMIZED|NO COLON HERE|MASKING: NONE (OPEN LABEL)"],
+                       index=[10, 11, 12, 13, 14, 15])
+    parsed = parse_key_value_field(values, keys)
+    expected = pd.DataFrame([legacy_parse(value) for value in values], index=values.index, columns=keys)
+    pd.testing.assert_frame_equal(parsed, expected, check_dtype=False)
+    assert pd.isna(parsed.loc[10, "MASKING"])
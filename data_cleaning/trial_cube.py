@@ -0,0 +1,54 @@
+import pandas as pd
+
+# the attributes counted in the cube: the name the World trials page shows and the column of the viz data it counts;
+# "All" counts every trial, for the map and the totals
+cube_attributes = {"All": None,
+                   "Status": "Status",
+                   "Phases": "Phases",
+                   "Duration": "Trial_Duration_Category",
+                   "Funded Bys": "Funded Bys",
+                   "Enrollment": "Enrollment_Category",
+                   "Age": "Age"}
+
+cube_keys = ["start_month", "completion_month", "Study Type", "Location_Country", "Location_Country_ISO",
+             "attribute", "value"]
+
+
+def build_trial_cube(df):
+    """A function used to count the trials by start month, completion month, study type, country and attribute value.
+
+    The dates of the viz data are months (parsed from "Month Year"), so rolling the cube up over a date range gives
+    the same counts as filtering the trials. Trials without a start or completion date are never in a date range and
+    are left out, as are missing attribute values, which the charts do not show.
+
+    Parameters
+    ----------
+    dataframe:
+        the viz data, from `get_df`.
+
+    Returns
+    -------
+    dataframe:
+        one row per combination of the `cube_keys` that has trials, with its `count`; a missing study type or
+        country is stored as "NAN" and a missing ISO code as "".
+
+    Examples
+    --------
+    >>> cube_df = build_trial_cube(get_df())
+    """
+    dated = df.dropna(subset=["Start Date", "Completion Date"])
+    base = pd.DataFrame({"start_month": pd.to_datetime(dated["Start Date"]),
+                         "completion_month": pd.to_datetime(dated["Completion Date"]),
+                         # the groupby below drops missing keys, so they get a value of their own
+                         "Study Type": dated["Study Type"].astype(object).fillna("NAN"),
+                         "Location_Country": dated["Location_Country"].astype(object).fillna("NAN"),
+                         "Location_Country_ISO": (dated["Location_Country_ISO"].astype(object).fillna("")
+                                                  if "Location_Country_ISO" in dated.columns else "")})
+    frames = []
+    for attribute, column in cube_attributes.items():
+        value = "All" if column is None else dated[column].astype(object)
+        frames.append(base.assign(attribute=attribute, value=value).dropna(subset=["value"]))
+    cube = pd.concat(frames, ignore_index=True).groupby(cube_keys).size().rename("count").reset_index()
+    for key in ["Study Type", "Location_Country", "Location_Country_ISO", "attribute", "value"]:
+        cube[key] = cube[key].astype("category")
+    return cube.sort_values("start_month", kind="mergesort").reset_index(drop=True)
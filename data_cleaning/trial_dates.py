@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+
+date_columns = ['Start Date',
+                'Completion Date',
+                'First Posted',
+                'Last Update Posted']
+
+duration_bins = [-float('inf'), 0, 3, 6, 12, 24, 60, 120, float('inf')]
+duration_labels = ['less then 1 month', '1 - 3 months', '4 - 6 months', '7 - 12 months',
+                   '1 - 2 years', '2 - 5 years', '5 - 10 years', 'over 10 years']
+
+enrollment_bins = [-float('inf'), 9, 50, 100, 200, 500, 1000, 5000, 10000, float('inf')]
+enrollment_labels = ['less then 10', '11 - 50', '51 - 100', '101 - 200',
+                     '201 - 500', '501 - 1000', '1001 - 5000', '5001 - 10000', 'over 10000']
+
+
+def parse_month_year(df, columns=date_columns):
+    """A function used to parse "MONTH YYYY" strings (e.g. "JULY 2020") of several columns into datetimes at once.
+
+    All cells of the selected columns are factorized together, so each distinct string is parsed only once
+    and the result is broadcast back with an integer take; "NAN NAN" and other unparsable values become NaT.
+
+    Parameters
+    ----------
+    dataframe:
+        the dataframe containing the date columns.
+    list:
+        the names of the date columns to parse.
+
+    Returns
+    -------
+    dataframe:
+        the parsed date columns (datetime64), with the same index as the input.
+
+    Examples
+    --------
+    >>> df[date_columns] = parse_month_year(df)
+    """
+    values = df[columns].to_numpy(dtype=object).ravel()
+    codes, uniques = pd.factorize(values)
+    parsed = pd.to_datetime(pd.Series(uniques, dtype=object), format="%B %Y", errors="coerce").to_numpy()
+    # missing cells are coded -1, which picks the trailing NaT
+    parsed = np.append(parsed, np.datetime64("NaT", "ns"))
+    dates = parsed[codes].reshape(len(df), len(columns))
+    return pd.DataFrame(dates, index=df.index, columns=columns)
+
+
+def month_delta(start_date, end_date):
+    """A function used to count the calendar months between two datetime columns.
+
+    Parameters
+    ----------
+    series:
+        the start dates.
+    series:
+        the end dates.
+
+    Returns
+    -------
+    series:
+        the number of months from start to end (negative if end is before start, NaN if either is missing).
+
+    Examples
+    --------
+    >>> df['Trial_Duration_Months'] = month_delta(df['Start Date'], df['Completion Date'])
+    """
+    return (end_date.dt.year - start_date.dt.year) * 12 + (end_date.dt.month - start_date.dt.month)
+
+
+def add_trial_duration(df, start='Start Date', end='Completion Date'):
+    """A function used to add the `Trial_Duration_Days` and `Trial_Duration_Months` columns with array arithmetic.
+
+    Parameters
+    ----------
+    dataframe:
+        the dataframe with parsed date columns.
+    str:
+        the name of the start date column.
+    str:
+        the name of the end date column.
+
+    Returns
+    -------
+    dataframe:
+        the dataframe with the two duration columns added.
+
+    Examples
+    --------
+    >>> df = add_trial_duration(df)
+    """
+    df['Trial_Duration_Days'] = (df[end] - df[start]).dt.days
+    df['Trial_Duration_Months'] = month_delta(df[start], df[end])
+    return df
+
+
+def add_categories(df):
+    """A function used to categorize the trial duration and the enrollment.
+
+    Parameters
+    ----------
+    dataframe:
+        the dataframe with `Trial_Duration_Months` and `Enrollment` columns.
+
+    Returns
+    -------
+    dataframe:
+        the dataframe with `Trial_Duration_Category` and `Enrollment_Category` columns added.
+
+    Examples
+    --------
+    >>> df = add_categories(add_trial_duration(df))
+    """
+    df["Trial_Duration_Category"] = pd.cut(df.Trial_Duration_Months, duration_bins, labels=duration_labels)
+    df["Enrollment_Category"] = pd.cut(df.Enrollment, enrollment_bins, labels=enrollment_labels)
+    return df
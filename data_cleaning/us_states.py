@@ -0,0 +1,108 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from countries import _normalize
+
+# one row per state (plus DC and Puerto Rico): an integer id, the USPS code used by plotly's "USA-states"
+# location mode, the upper-cased name and the '|'-separated raw spellings that stand for it
+state_dimension_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "us_states.tsv")
+
+state_count_columns = ["state_code", "Phases", "Intervention Type", "Number of trials", "Number of sites"]
+
+
+def read_state_dimension(path=state_dimension_path):
+    """A function used to read the US state dimension table.
+
+    Parameters
+    ----------
+    str:
+        the filename of the state dimension TSV.
+
+    Returns
+    -------
+    dataframe:
+        the `state_id`, `state_code`, `state_name` and `aliases` columns.
+
+    Examples
+    --------
+    >>> states = read_state_dimension()
+    """
+    # "NA" is not a state, but keep_default_na=False keeps the codes and names from ever being read as missing
+    return pd.read_csv(path, sep="\t", keep_default_na=False, na_values=[""], dtype={"aliases": object})
+
+
+def state_lookup(states=None):
+    """A function used to map every known raw state name (the names, USPS codes and aliases) to its USPS code.
+
+    Parameters
+    ----------
+    dataframe:
+        the state dimension; read from `us_states.tsv` if None.
+
+    Returns
+    -------
+    dictionary:
+        the normalized raw name mapped to `state_code`.
+    """
+    if states is None:
+        states = read_state_dimension()
+    lookup = {}
+    for code, name, aliases in states[["state_code", "state_name", "aliases"]].itertuples(index=False, name=None):
+        lookup[_normalize(code)] = code
+        lookup[_normalize(name)] = code
+        if isinstance(aliases, str):
+            for alias in aliases.split("|"):
+                lookup[_normalize(alias)] = code
+    return lookup
+
+
+def names_to_state_codes(names, lookup=None):
+    """A function used to map a column of US state names (e.g. `Location_City_or_State`) to USPS codes.
+
+    The column is factorized so each distinct name is resolved once. Sites listed with a city instead of a
+    state get a missing code.
+
+    Examples
+    --------
+    >>> names_to_state_codes(pd.Series(["NORTH CAROLINA", "Massachusetts", "BOSTON"])).tolist()
+    ['NC', 'MA', nan]
+    """
+    if lookup is None:
+        lookup = state_lookup()
+    codes, uniques = pd.factorize(names)
+    # missing names are coded -1, which picks the trailing NaN
+    state_codes = np.array([lookup.get(_normalize(name), np.nan) for name in uniques] + [np.nan], dtype=object)
+    return pd.Series(state_codes[codes], index=names.index, name="state_code")
+
+
+def state_counts(us_sites):
+    """A function used to count the US trials and sites by state, phase and intervention type.
+
+    Each trial has a single phase and intervention type (that of its first intervention), so summing
+    `Number of trials` over phases or intervention types within a state counts every trial once.
+
+    Parameters
+    ----------
+    dataframe:
+        the US sites, one row per trial and site, with the `state_code`, `Phases`, `Intervention Type` and
+        `NCT Number` columns.
+
+    Returns
+    -------
+    dataframe:
+        one row per state, phase and intervention type, with the `Number of trials` and `Number of sites`
+        columns; sites without a known state are left out.
+
+    Examples
+    --------
+    >>> us_data_df["state_code"] = names_to_state_codes(us_data_df["Location_City_or_State"])
+    >>> state_count_df = state_counts(us_data_df)
+    """
+    keys = ["state_code", "Phases", "Intervention Type"]
+    # missing phases are kept as their own group instead of being dropped by the groupby
+    sites = us_sites[keys + ["NCT Number"]].dropna(subset=["state_code"]).fillna({"Phases": "UNKNOWN"})
+    grouped = sites.groupby(keys)["NCT Number"]
+    counts = pd.DataFrame({"Number of trials": grouped.nunique(), "Number of sites": grouped.size()})
+    return counts.reset_index()[state_count_columns]
@@ -0,0 +1,30 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+
+def write_columnar(df, path, geometry_column=None):
+    """A function used to write a dataframe as an uncompressed Arrow IPC (Feather v2) file.
+
+    Unlike the TSV outputs, the file keeps the dtypes (categoricals, datetimes, numerics) and the index,
+    supports reading a subset of columns, and can be memory-mapped by the dashboard loaders (`dashboard/columnar.py`,
+    which expects this layout: the pandas metadata of the table and WKB geometry).
+
+    Parameters
+    ----------
+    dataframe:
+        the dataframe (or GeoDataFrame) to write.
+    str:
+        the output filename, conventionally ending in ".feather".
+    str:
+        the name of the geometry column, which is stored as WKB bytes; None if there is no geometry.
+
+    Examples
+    --------
+    >>> write_columnar(geo_country_count_df, "cleaned_data_for_map_with_geo.feather", geometry_column="geometry")
+    """
+    if geometry_column is not None:
+        df = pd.DataFrame(df)
+        df[geometry_column] = [g.wkb if g is not None else None for g in df[geometry_column]]
+    table = pa.Table.from_pandas(df)
+    feather.write_feather(table, path, compression="uncompressed")
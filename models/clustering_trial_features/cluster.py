@@ -1,10 +1,15 @@
-from datetime import datetime
+import os
+import sys
 from kmodes.kmodes import KModes
 
 import pandas as pd
 import numpy as np
 import sqlite3
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "data_cleaning"))
+from db_schema import study_design_list, intervention_list
+from trial_dates import date_columns, parse_month_year, add_trial_duration, add_categories
+
 import plotly.express as px
 
 def get_data_for_cluster():
@@ -14,8 +19,10 @@ def get_data_for_cluster():
     # load in data
     conn = sqlite3.connect('covid_trials.db')
     trial_info=pd.read_sql("select * from trial_info", con = conn)
-    study_designs=pd.read_sql("select * from study_designs", con = conn)
-    interventions=pd.read_sql("select * from interventions", con = conn)
+    # one join on the "NCT Number" primary keys instead of two full-table reads merged in pandas
+    designs_and_interventions=pd.read_sql('select * from study_designs join interventions using ("NCT Number")', con = conn)
+    study_designs=designs_and_interventions[["NCT Number"] + study_design_list]
+    interventions=designs_and_interventions[["NCT Number"] + intervention_list].copy()
     funded_bys=pd.read_sql("select * from funded_bys", con = conn)
     conn.close()
 
@@ -26,74 +33,13 @@ def get_data_for_cluster():
     df['Age'] = df.Age.str.extract(r'[(](.*?)[)]')
 
     ## date
-    date_columns = ['Start Date',                       
-                    'Completion Date',
-                    'First Posted',
-                    'Last Update Posted' ]
-
-    def rep_m(m):
-        months = ["January", "February", "March", "April", "May", "June", "July", 
-                "August", "September", "October", "November", "December"]
-        months = [x.upper() for x in months]
-        for i in months:
-            if m == i:
-                m = months.index(i) + 1
-        return str(m)
-
-    def to_date(date_str):
-        if date_str == "NAN NAN":
-            return np.nan
-        else:
-            date_str = date_str.split()
-            Y = date_str[1]
-            m = rep_m(date_str[0])
-
-            date = datetime.strptime(Y + "-" + m, "%Y-%m")
-
-            return date
-
-
-    df[date_columns] = df[date_columns].applymap(to_date)
+    df[date_columns] = parse_month_year(df, date_columns)
 
     ## trial duration
-    def get_interval_day(arrLike, start, end):   
-        start_date = arrLike[start]
-        end_date = arrLike[end]
-
-        return (end_date - start_date).days
-
-    def month_delta(start_date, end_date):
-        flag = True
-        if start_date > end_date:
-            start_date, end_date = end_date, start_date
-            flag = False
-        year_diff = end_date.year - start_date.year
-        end_month = year_diff * 12 + end_date.month
-        delta = end_month - start_date.month
-        return -delta if flag is False else delta
-
-
-    def get_interval_month(arrLike, start, end):   
-        start_date = arrLike[start]
-        end_date = arrLike[end]
-
-        return month_delta(start_date, end_date)
-
-    df['Trial_Duration_Days'] = df.apply(
-        get_interval_day, axis=1, args=('Start Date', 'Completion Date'))
-
-    df['Trial_Duration_Months'] = df.apply(
-        get_interval_month, axis=1, args=('Start Date', 'Completion Date'))
+    df = add_trial_duration(df, 'Start Date', 'Completion Date')
 
     ## categorize numeric variables
-    df["Trial_Duration_Category"] = pd.cut(df.Trial_Duration_Months,
-                                        [-float('inf'),0,3,6,12,24,60,120,float('inf')],
-                                        labels=['less then 1 month','1 - 3 months','4 - 6 months','7 - 12 months',
-                                                '1 - 2 years','2 - 5 years','5 - 10 years','over 10 years'])
-    df["Enrollment_Category"] = pd.cut(df.Enrollment,
-                                    [-float('inf'),9,50,100,200,500,1000,5000,10000,float('inf')],
-                                    labels=['less then 10','11 - 50','51 - 100','101 - 200',
-                                            '201 - 500','501 - 1000','1001 - 5000','5001 - 10000','over 10000'])
+    df = add_categories(df)
 
     ## clean study type variable
     df["Study Type"] = (
@@ -1,6 +1,7 @@
+import os
+import sys
 import pandas as pd 
 import numpy as np
-from datetime import datetime
 import imblearn
 from sklearn.model_selection import train_test_split
 from sklearn.dummy import DummyClassifier
@@ -10,6 +11,10 @@ from sklearn.svm import SVC
 from sklearn.tree import DecisionTreeClassifier
 from sklearn.neural_network import MLPClassifier
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "data_cleaning"))
+from dtypes import upper_case_columns
+from trial_dates import parse_month_year, month_delta
+
 ### read data
 covid_trials_df = pd.read_csv("data/SearchResults_new.tsv", sep="\t")
 
@@ -45,7 +50,7 @@ covid_trials_df.loc[:,"Location_Institution"] = [str(i).split(",")[0].strip()
                                                    for i in list(covid_trials_df["Locations"].copy())]
 
 ### char
-covid_trials_df = covid_trials_df.applymap(lambda s:s.upper() if type(s) == str else s)
+covid_trials_df = upper_case_columns(covid_trials_df)
 covid_trials_df = covid_trials_df.replace("nan", np.nan)
 covid_trials_df = covid_trials_df.replace("NaN", np.nan)
 
@@ -88,54 +93,8 @@ covid_trials_df['Locations'] = covid_trials_df['Locations'].replace(np.nan, "OTH
 ########################################################################################
 
 ### duration
-from datetime import datetime
-
-date_columns = ['Start Date',                       
-                'Completion Date',
-                'First Posted',
-                'Last Update Posted' ]
-
-def rep_m(m):
-    months = ["January", "February", "March", "April", "May", "June", "July", 
-              "August", "September", "October", "November", "December"]
-    months = [x.upper() for x in months]
-    for i in months:
-        if m == i:
-            m = months.index(i) + 1
-    return str(m)
-
-def to_date(date_str):
-    if date_str == "NAN NAN":
-        return np.nan
-    else:
-        date_str = date_str.split()
-        Y = date_str[1]
-        m = rep_m(date_str[0])
-
-        date = datetime.strptime(Y + "-" + m, "%Y-%m")
-
-        return date
-
-# https://blog.csdn.net/u010339879/article/details/79505570
-def month_delta(start_date, end_date):
-    flag = True
-    if start_date > end_date:
-        start_date, end_date = end_date, start_date
-        flag = False
-    year_diff = end_date.year - start_date.year
-    end_month = year_diff * 12 + end_date.month
-    delta = end_month - start_date.month
-    return -delta if flag is False else delta
-
-def get_interval_month(arrLike, start, end):   
-    start_date = arrLike[start]
-    end_date = arrLike[end]
-
-    return month_delta(start_date, end_date)
-
-covid_trials_df[date_columns] = covid_trials_df[date_columns].applymap(to_date)
-covid_trials_df['Trial_Duration_Months'] = covid_trials_df.apply(
-    get_interval_month, axis=1, args=('Start Date', 'Completion Date'))
+covid_trials_df[date_columns] = parse_month_year(covid_trials_df, date_columns)
+covid_trials_df['Trial_Duration_Months'] = month_delta(covid_trials_df['Start Date'], covid_trials_df['Completion Date'])
 
 ########################################################################################
 